@@ -0,0 +1,4 @@
+'''
+Бэкенд postgres с пулом соединений в процессе: ENGINE = 'backend.db_pool'.
+Размер и таймауты задаются ключом POOL в настройках базы, см. settings.DATABASES.
+'''
@@ -0,0 +1,61 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from django.utils.asyncio import async_unsafe
+
+from . import pool as pools
+from .pool import TRANSACTION_IDLE, ConnectionPool
+
+
+def ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if connection.info.transaction_status != TRANSACTION_IDLE:
+        connection.rollback()
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+    # postgres не даст удалить или скопировать базу, пока в пуле висят соединения к ней
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        pools.close_all()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        pools.close_all()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        return pools.get_pool(key, lambda: ConnectionPool(
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+            check_after=options.get('CHECK_AFTER', 30),
+            max_lifetime=options.get('MAX_LIFETIME', 30 * 60),
+            check=ping,
+        ))
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+
+        def connect():
+            connection = super(DatabaseWrapper, self).get_new_connection(conn_params)
+            # родительский метод выставляет isolation_level при подключении, для соединений из пула - мы
+            pool.isolation_level = self.isolation_level
+            return connection
+
+        connection = pool.checkout(connect)
+        self.isolation_level = pool.isolation_level
+        self._pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # закрытое внутри atomic соединение Django ещё держит до конца блока, отдавать его нельзя
+                self._pool.checkin(self.connection, reusable=not self.in_atomic_block)
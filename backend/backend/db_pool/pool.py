@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.db.utils import OperationalError
+
+# статусы транзакции libpq, одинаковые у psycopg2 и psycopg
+TRANSACTION_IDLE = 0
+TRANSACTION_ACTIVE = 1
+TRANSACTION_UNKNOWN = 4
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    '''
+    Пул соединений одного процесса. Django по-прежнему закрывает соединение в конце запроса
+    или задачи (CONN_MAX_AGE=0), а DatabaseWrapper вместо закрытия возвращает его сюда.
+    Соединение не привязано к потоку, поэтому пул работает и под ASGI, где каждый
+    запрос выполняется в новом потоке и постоянные соединения Django не переиспользуются.
+    '''
+
+    def __init__(self, max_size, timeout=10, check_after=30, max_lifetime=30 * 60, check=None):
+        self._check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        # простоявшее дольше check_after секунд соединение перед выдачей проверяется SELECT 1
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        # (соединение, когда открыто, когда вернулось в пул)
+        self._idle = deque()
+        # время открытия выданных соединений, нужно при возврате для max_lifetime
+        self._opened = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._counts = Counter()
+        self._timings = Counter()
+
+    def checkout(self, connect):
+        '''свободное соединение из пула или новое от connect(), если пул ещё не заполнен'''
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._counts['timeouts'] += 1
+                        raise PoolTimeout(f'в пуле нет свободных соединений {self.timeout} с, размер {self.max_size}')
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    # последним вернувшееся соединение реже требует проверки
+                    connection, opened, returned = self._idle.pop()
+                else:
+                    connection = None
+                    self._size += 1
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._release()
+                    raise
+                opened = time.monotonic()
+                outcome = 'connects'
+            elif not self._usable(connection, opened, returned):
+                self._discard(connection)
+                continue
+            else:
+                outcome = 'reused'
+            break
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._counts['checkouts'] += 1
+            self._counts[outcome] += 1
+            self._timings['checkout'] += elapsed
+            if waited:
+                self._counts['waits'] += 1
+                self._timings['wait'] += elapsed
+                self._timings['max_wait'] = max(self._timings['max_wait'], elapsed)
+            self._opened[id(connection)] = opened
+        return connection
+
+    def _usable(self, connection, opened, returned):
+        now = time.monotonic()
+        if connection.closed or now - opened > self.max_lifetime:
+            return False
+        if self._check is None or now - returned < self.check_after:
+            return True
+        try:
+            self._check(connection)
+        except Exception:
+            self._count('health_check_failures')
+            return False
+        finally:
+            self._count('health_checks')
+        return True
+
+    def _count(self, key):
+        with self._cond:
+            self._counts[key] += 1
+
+    def checkin(self, connection, reusable=True):
+        with self._cond:
+            opened = self._opened.pop(id(connection), time.monotonic())
+        if not reusable or not self._reset(connection) or time.monotonic() - opened > self.max_lifetime:
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, opened, time.monotonic()))
+            self._cond.notify()
+
+    def _reset(self, connection):
+        '''откатывает незавершённую транзакцию, False - соединение больше не годится'''
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status in (TRANSACTION_ACTIVE, TRANSACTION_UNKNOWN):
+            return False
+        if status != TRANSACTION_IDLE:
+            try:
+                connection.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, connection):
+        self._count('discarded')
+        self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._release()
+
+    def _release(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def close(self):
+        '''закрывает свободные соединения, выданные закроются при возврате'''
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def forget(self):
+        '''
+        Сбрасывает пул в дочернем процессе после fork. Сокеты унаследованных соединений
+        общие с родителем, поэтому закрывать их нельзя - они просто остаются висеть в памяти.
+        '''
+        # замок мог быть захвачен другим потоком родителя в момент fork, поэтому он создаётся заново
+        self._cond = threading.Condition()
+        _inherited.extend(connection for connection, _, _ in self._idle)
+        self._idle = deque()
+        self._size = 0
+        self._opened = {}
+        self._counts.clear()
+        self._timings.clear()
+
+    def stats(self):
+        with self._cond:
+            counts, timings = dict(self._counts), dict(self._timings)
+            idle, size = len(self._idle), self._size
+        checkouts, waits = counts.get('checkouts', 0), counts.get('waits', 0)
+        return {
+            'pid': os.getpid(),
+            'max_size': self.max_size,
+            'size': size,
+            'idle': idle,
+            'in_use': size - idle,
+            **{key: counts.get(key, 0) for key in ('checkouts', 'connects', 'reused', 'waits', 'timeouts',
+                                                    'health_checks', 'health_check_failures', 'discarded')},
+            'avg_checkout_ms': round(timings.get('checkout', 0) / checkouts * 1000, 3) if checkouts else None,
+            'avg_wait_ms': round(timings.get('wait', 0) / waits * 1000, 3) if waits else None,
+            'max_wait_ms': round(timings.get('max_wait', 0) * 1000, 3),
+        }
+
+
+_inherited = []
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = factory()
+        return _pools[key]
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def stats():
+    with _pools_lock:
+        return [{'database': key[0], **pool.stats()} for key, pool in _pools.items()]
+
+
+def _after_fork():
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        pool.forget()
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,45 @@
+'''
+Middleware сайта, которые не нужны внутреннему api: бот не пользуется ни сессиями,
+ни cookie, ни csrf. Для путей INTERNAL_API_PREFIX они сразу передают запрос дальше,
+для остальных (админка и т.п.) работают как обычно.
+'''
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, csrf
+
+
+def is_internal_api(request):
+    return request.path_info.startswith(settings.INTERNAL_API_PREFIX)
+
+
+class SkipForInternalAPIMixin:
+    def __call__(self, request):
+        # в async режиме MiddlewareMixin помечает self корутиной, и get_response тоже вернёт корутину
+        if is_internal_api(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SkipForInternalAPIMixin, sessions.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SkipForInternalAPIMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_internal_api(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(SkipForInternalAPIMixin, auth.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(SkipForInternalAPIMixin, messages.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(SkipForInternalAPIMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
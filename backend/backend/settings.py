@@ -56,14 +56,17 @@ INSTALLED_APPS = [
     'courseapi.apps.CourseapiConfig'
 ]
 
+# запросы бота к INTERNAL_API_PREFIX проходят только security и common, см. backend/middleware.py
+INTERNAL_API_PREFIX = '/api/v1/'
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.CsrfViewMiddleware',
+    'backend.middleware.AuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware',
+    'backend.middleware.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -113,6 +116,30 @@ else:
         }
     }
 
+# кто запускает процесс, задаётся явно в команде запуска (Procfile, docker-compose): web или worker
+DB_POOL_ROLE = env.str('DB_POOL_ROLE', default='web')
+
+if env.bool('DB_POOL', default=True):
+    # соединения живут в пуле процесса (backend/db_pool), Django лишь берёт их на запрос или задачу.
+    # Веб обслуживает много запросов сразу, а процесс воркера селери выполняет по одной задаче
+    DATABASES['default'].update({
+        'ENGINE': 'backend.db_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': (env.int('DB_WORKER_POOL_SIZE', default=2) if DB_POOL_ROLE == 'worker'
+                         else env.int('DB_POOL_SIZE', default=10)),
+            'TIMEOUT': env.float('DB_POOL_TIMEOUT', default=10),
+            'CHECK_AFTER': env.float('DB_POOL_CHECK_AFTER', default=30),
+            'MAX_LIFETIME': env.float('DB_POOL_MAX_LIFETIME', default=30 * 60),
+        },
+    })
+else:
+    # постоянные соединения Django, под ASGI они не переиспользуются - там нужен пул
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -156,6 +183,10 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GSHEET_CREDS = BASE_DIR / 'gsheet_creds.json'
+# сколько секунд воркер копит записи в таблицу перед одним batch_update
+GSHEETS_FLUSH_WINDOW = env.float('GSHEETS_FLUSH_WINDOW', default=2.0)
+# писать в таблицу в памяти вместо гугла (courseapi/fake_gspread.py)
+GSHEETS_FAKE = env.bool('GSHEETS_FAKE', default=False)
 
 
 if IS_HEROKU_APP:
@@ -164,6 +195,41 @@ if IS_HEROKU_APP:
 else:
     CELERY_BROKER_URL = f"redis://{env('REDIS_HOST')}:{env('REDIS_PORT')}"
     CELERY_RESULT_BACKEND = f"redis://{env('REDIS_HOST')}:{env('REDIS_PORT')}"
+LEADERBOARD_REDIS_URL = CELERY_BROKER_URL
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('CACHE_REDIS_URL', default=CELERY_BROKER_URL),
+        'KEY_PREFIX': 'courseapi',
+    }
+}
+# сколько секунд живут закешированные ответы, если их раньше не сбросила запись
+RESPONSE_CACHE_TTL = env.int('RESPONSE_CACHE_TTL', default=5 * 60)
+
+REST_FRAMEWORK = {
+    # api внутреннее: без авторизации, без browsable api, ответы всегда json через orjson
+    'DEFAULT_RENDERER_CLASSES': ['courseapi.renderers.ORJSONRenderer'],
+    # бот шлёт простые формы, остальные запросы - json
+    'DEFAULT_PARSER_CLASSES': ['courseapi.renderers.ORJSONParser', 'rest_framework.parsers.FormParser'],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'courseapi.renderers.JSONOnlyNegotiation',
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+    'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-gsheets': {
+        'task': 'courseapi.task.reconcile_gsheets',
+        'schedule': env.float('GSHEETS_RECONCILE_INTERVAL', default=60 * 60),
+    },
+    'rebuild-leaderboard': {
+        'task': 'courseapi.task.rebuild_leaderboard',
+        'schedule': env.float('LEADERBOARD_REBUILD_INTERVAL', default=15 * 60),
+    },
+}
+
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     'max_retries': 3,
     'interval_start': 0,
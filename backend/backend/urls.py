@@ -16,27 +16,34 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from courseapi import views
+from courseapi import async_views, views
 
 urlpatterns = [
     path('api/v1/test', views.TestAPIView.as_view()),
     path('api/v1/newmember', views.MemberCreateAPIView.as_view()),
+    path('api/v1/members/import', views.MemberImportAPIView.as_view()),
     path('api/v1/delmember/<slug:username>', views.MemberDeleteAPIView.as_view()),
 
-    path('api/v1/statistic/<int:limit>', views.StatisticAPIView.as_view()),
+    path('api/v1/statistic/<int:limit>', async_views.StatisticView.as_view()),
+    path('api/v1/recipients', views.RecipientsAPIView.as_view()),
+    path('api/v1/cachestats', views.CacheStatsAPIView.as_view()),
+    path('api/v1/dbstats', views.DatabasePoolStatsAPIView.as_view()),
 
-    path('api/v1/timetable', views.TaskAPIView.as_view()),
+    path('api/v1/timetable', async_views.TimetableView.as_view()),
     path('api/v1/tasks/started', views.TaskStartedAPIView.as_view()),
     path('api/v1/tasks/ended', views.TaskEndedAPIView.as_view()),
-    path('api/v1/<slug:username>/whoami', views.MemberRoleAPIView.as_view()),
+    path('api/v1/<slug:username>/whoami', async_views.MemberRoleView.as_view()),
+    path('api/v1/<slug:username>/chat', views.MemberChatAPIView.as_view()),
 
     path('api/v1/<slug:username>/sendhw', views.HomeworkSendAPIView.as_view()),
 
     path('api/v1/<slug:username>/students', views.MemberStudentsAPIView.as_view()),
     path('api/v1/<slug:username>/students/<int:task>', views.MemberStudentsByTaskAPIView.as_view()),
-    path('api/v1/<slug:username>/homeworks', views.HomeworkAPIView.as_view()),
+    path('api/v1/<slug:username>/homeworks', async_views.HomeworkView.as_view()),
     path('api/v1/<slug:username>/checkhw', views.HomeworkCheckAPIView.as_view()),
-    path('api/v1/<slug:username>/groupedhwinfo', views.HomeworkGroupedAPIView.as_view()),
-    path('api/v1/<slug:username>/statistic/<int:limit>', views.StatisticAPIView.as_view()),
+    path('api/v1/<slug:username>/checkhw/bulk', views.HomeworkBulkCheckAPIView.as_view()),
+    path('api/v1/<slug:username>/card/<slug:student_username>', views.StudentCardAPIView.as_view()),
+    path('api/v1/<slug:username>/groupedhwinfo', async_views.HomeworkGroupedView.as_view()),
+    path('api/v1/<slug:username>/statistic/<int:limit>', async_views.StatisticView.as_view()),
     path('api/v1/<slug:username>/expel/<slug:student_username>', views.MemberExpelAPIView.as_view()),
 ]
@@ -0,0 +1,115 @@
+'''
+Асинхронные версии самых частых запросов бота. Под ASGI (gunicorn + uvicorn) они не занимают
+поток на время ожидания базы и редиса, а под WSGI Django сам прогоняет их через event loop,
+поэтому они работают в обоих режимах. Запись остаётся синхронной, в views.py.
+'''
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+
+from . import caching, leaderboard
+from .models import Member, Homework, Task, Statistic
+from .pagination import StatisticPagination
+from .renderers import dumps
+from .serializers import HomeworkListValuesSerializer, StatisticValuesSerializer, TaskValuesSerializer
+from .views import StatisticAPIView
+
+
+def _response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+async def _conditional(request, namespaces, build):
+    '''как ConditionalResponseMixin: 304 по версиям пространств имён, без похода в базу'''
+    etag = await caching.aetag(namespaces, request.get_full_path())
+    response = get_conditional_response(request, etag=etag) if etag else None
+    if response is None:
+        response = _response(await build())
+    if etag and response.status_code in (200, 304):
+        response['ETag'] = etag
+    return response
+
+
+class MemberRoleView(View):
+    async def get(self, request, username):
+        async def build():
+            return await Member.objects.filter(username=username).values('role').afirst()
+
+        # 404 не кешируется: бот сам помнит не-участников, а новый участник сразу получит роль
+        role = await caching.afetch('whoami', [username], build, namespace=f'whoami:{username}')
+        if role is None:
+            return _response({'detail': 'Not found.'}, status=404)
+        return _response(role)
+
+
+class TimetableView(View):
+    async def get(self, request):
+        # расписание меняется редко, поэтому бот перепроверяет его через If-None-Match
+        timetable = await caching.afetch('timetable', [], self.build_timetable, namespace='tasks')
+        etag, last_modified = timetable['etag'], timetable['last_modified']
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = _response(timetable['tasks'])
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    async def build_timetable(self):
+        info = await Task.objects.aaggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated'))
+        last_modified = int(info['updated'].timestamp()) if info['updated'] else None
+        tasks = await _alist(TaskValuesSerializer.values_list(Task.objects.order_by('id')))
+        return {
+            'etag': quote_etag(f"{info['count']}-{info['last_id']}-{last_modified}"),
+            'last_modified': last_modified,
+            'tasks': TaskValuesSerializer(tasks).data,
+        }
+
+
+class HomeworkView(View):
+    async def get(self, request, username):
+        async def build():
+            homeworks = Homework.objects.filter(owner__username=username).order_by('task')
+            return HomeworkListValuesSerializer(await _alist(HomeworkListValuesSerializer.values_list(homeworks))).data
+
+        return await _conditional(request, [f'homeworks:{username}'], build)
+
+
+class HomeworkGroupedView(View):
+    async def get(self, request, username):
+        async def build():
+            grouped = (Homework.objects.filter(owner__tutor__username=username, mark__isnull=True)
+                                       .values('task_id').annotate(kol=Count('task_id')).order_by('task_id'))
+            return await caching.afetch('grouped', [username], lambda: _alist(grouped), namespace=f'tutor:{username}')
+
+        return await _conditional(request, [f'tutor:{username}'], build)
+
+
+class StatisticView(View):
+    # ?cursor= листает весь рейтинг страницами, это делает синхронный DRF view
+    paginated = staticmethod(StatisticAPIView.as_view())
+
+    async def get(self, request, limit, username=None):
+        if StatisticPagination.cursor_query_param in request.GET:
+            kwargs = {'limit': limit} if username is None else {'limit': limit, 'username': username}
+            return await sync_to_async(self.paginated)(request, **kwargs)
+
+        async def build():
+            # рейтинг читается из ZSET в редисе, база нужна, только пока он не собран
+            statistics = await sync_to_async(leaderboard.top, thread_sensitive=False)(limit, username)
+            if statistics is None:
+                queryset = Statistic.objects.filter(tutor__username=username) if username else Statistic.objects
+                queryset = StatisticValuesSerializer.values_list(queryset).order_by(*StatisticPagination.ordering)
+                statistics = StatisticValuesSerializer(await _alist(queryset[:limit])).data
+            return list(statistics)
+
+        return _response(await caching.afetch('statistic', [username or '*', limit], build,
+                                              namespace=f'statistic:{username}' if username else 'statistic'))
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
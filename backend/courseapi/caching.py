@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import time
+from collections import Counter
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import quote_etag
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ('timetable', 'tasks', 'whoami', 'grouped', 'statistic')
+
+# счётчики копятся в процессе и раз в STATS_FLUSH_INTERVAL секунд сбрасываются в редис
+STATS_FLUSH_INTERVAL = 5
+_counts = Counter()
+_flushed = time.monotonic()
+
+
+def _namespace_key(namespace):
+    return f'ns:{namespace}'
+
+
+def _initial_version():
+    # если редис потеряет счётчик, новая версия всё равно окажется больше всех выданных раньше
+    return time.time_ns() // 1000
+
+
+def _key(endpoint, parts, namespace):
+    key = ':'.join([endpoint, *map(str, parts)])
+    if namespace is None:
+        return key
+    # ключи пространства имён устаревают все разом при увеличении его версии
+    version = cache.get_or_set(_namespace_key(namespace), _initial_version, None)
+    return f'{key}:v{version}'
+
+
+async def _akey(endpoint, parts, namespace):
+    key = ':'.join([endpoint, *map(str, parts)])
+    if namespace is None:
+        return key
+    version = await cache.aget_or_set(_namespace_key(namespace), _initial_version, None)
+    return f'{key}:v{version}'
+
+
+def fetch(endpoint, parts, build, namespace=None, timeout=None):
+    '''
+    Ответ endpoint из кеша или build(). build возвращает None, если ответ кешировать нельзя.
+    Если редис недоступен, всё просто идёт в базу. Данные, которые сбрасываются при записи,
+    кешируются только в пространстве имён: версия берётся до чтения из базы, поэтому ответ,
+    собранный до сброса и записанный после него, ляжет под старую версию и не будет прочитан.
+    '''
+    try:
+        key = _key(endpoint, parts, namespace)
+        value = cache.get(key)
+    except redis.RedisError as error:
+        logger.error(error)
+        return build()
+    _record(endpoint, 'hits' if value is not None else 'misses')
+    if value is not None:
+        return value
+
+    value = build()
+    if value is not None:
+        try:
+            cache.set(key, value, timeout or settings.RESPONSE_CACHE_TTL)
+        except redis.RedisError as error:
+            logger.error(error)
+    return value
+
+
+async def afetch(endpoint, parts, build, namespace=None, timeout=None):
+    '''то же, что fetch, для async views: build - корутинная функция'''
+    try:
+        key = await _akey(endpoint, parts, namespace)
+        value = await cache.aget(key)
+    except redis.RedisError as error:
+        logger.error(error)
+        return await build()
+    await _arecord(endpoint, 'hits' if value is not None else 'misses')
+    if value is not None:
+        return value
+
+    value = await build()
+    if value is not None:
+        try:
+            await cache.aset(key, value, timeout or settings.RESPONSE_CACHE_TTL)
+        except redis.RedisError as error:
+            logger.error(error)
+    return value
+
+
+def _invalidate(keys=(), namespaces=()):
+    try:
+        if keys:
+            cache.delete_many(list(keys))
+        for namespace in namespaces:
+            key = _namespace_key(namespace)
+            cache.add(key, _initial_version(), None)
+            cache.incr(key)
+    except redis.RedisError as error:
+        logger.error(error)
+
+
+def invalidate(keys=(), namespaces=()):
+    '''сбрасывает кеш после коммита, чтобы параллельный запрос не закешировал старые данные'''
+    keys, namespaces = list(keys), list(namespaces)
+    transaction.on_commit(lambda: _invalidate(keys, namespaces))
+
+
+def etag(namespaces, *parts):
+    '''
+    ETag из текущих версий пространств имён: меняется при любой записи в них, а считается
+    без обращения к базе. None, если редис недоступен.
+    '''
+    keys = [_namespace_key(namespace) for namespace in namespaces]
+    try:
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                versions[key] = cache.get_or_set(key, _initial_version, None)
+    except redis.RedisError as error:
+        logger.error(error)
+        return None
+    return _etag(keys, versions, parts)
+
+
+async def aetag(namespaces, *parts):
+    keys = [_namespace_key(namespace) for namespace in namespaces]
+    try:
+        versions = await cache.aget_many(keys)
+        for key in keys:
+            if key not in versions:
+                versions[key] = await cache.aget_or_set(key, _initial_version, None)
+    except redis.RedisError as error:
+        logger.error(error)
+        return None
+    return _etag(keys, versions, parts)
+
+
+def _etag(keys, versions, parts):
+    source = '|'.join([*map(str, parts), *(f'{key}={versions[key]}' for key in keys)])
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+def statistic_namespaces(tutors):
+    return ['statistic', *(f'statistic:{tutor}' for tutor in set(tutors) if tutor)]
+
+
+def tutor_namespaces(tutors):
+    return [f'tutor:{tutor}' for tutor in set(tutors) if tutor]
+
+
+def homework_submitted(username, tutor):
+    invalidate(namespaces=[f'homeworks:{username}', *tutor_namespaces([tutor])])
+
+
+def homeworks_checked(students, tutors):
+    invalidate(namespaces=[*statistic_namespaces(tutors), *tutor_namespaces(tutors),
+                           *(f'homeworks:{student}' for student in set(students))])
+
+
+def members_created(tutors):
+    # отрицательный whoami не кешируется, поэтому новому участнику сбрасывать нечего
+    tutors = list(tutors)
+    invalidate(namespaces=[*statistic_namespaces(tutors), *tutor_namespaces(tutors)])
+
+
+def member_removed(username, tutor):
+    invalidate(namespaces=[*statistic_namespaces([tutor]), *tutor_namespaces([tutor]),
+                           f'homeworks:{username}', f'whoami:{username}'])
+
+
+@receiver([post_save, post_delete], sender=Task)
+def tasks_changed(**kwargs):
+    # дз правятся только через админку, поэтому сбрасываем по сигналу модели
+    invalidate(namespaces=['tasks'])
+
+
+def _record(endpoint, outcome):
+    _counts[(endpoint, outcome)] += 1
+    if time.monotonic() - _flushed >= STATS_FLUSH_INTERVAL:
+        flush_stats()
+
+
+async def _arecord(endpoint, outcome):
+    _counts[(endpoint, outcome)] += 1
+    if time.monotonic() - _flushed >= STATS_FLUSH_INTERVAL:
+        await sync_to_async(flush_stats)()
+
+
+def flush_stats():
+    global _flushed
+    counts = dict(_counts)
+    _counts.clear()
+    _flushed = time.monotonic()
+    try:
+        for (endpoint, outcome), count in counts.items():
+            key = f'stats:{endpoint}:{outcome}'
+            cache.add(key, 0, None)
+            cache.incr(key, count)
+    except redis.RedisError as error:
+        logger.error(error)
+
+
+def stats():
+    '''попадания и промахи по всем процессам с момента последнего сброса редиса'''
+    flush_stats()
+    keys = [f'stats:{endpoint}:{outcome}' for endpoint in ENDPOINTS for outcome in ('hits', 'misses')]
+    try:
+        values = cache.get_many(keys)
+    except redis.RedisError as error:
+        logger.error(error)
+        values = {}
+    result = {}
+    for endpoint in ENDPOINTS:
+        hits = values.get(f'stats:{endpoint}:hits', 0)
+        misses = values.get(f'stats:{endpoint}:misses', 0)
+        result[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return result
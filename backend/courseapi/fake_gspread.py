@@ -0,0 +1,77 @@
+'''
+Заглушка gspread в памяти для тестов и локальной разработки без доступа к гуглу
+(GSHEETS_FAKE=True). Поддерживает только то, чем пользуется courseapi.
+'''
+import json
+import threading
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+
+
+def api_error(status, message='fake error'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({'error': {'code': status, 'message': message, 'status': 'FAKE'}}).encode()
+    return APIError(response)
+
+
+class FakeWorksheet:
+    def __init__(self):
+        self.cells = {}
+        self.calls = []
+        # статусы, которыми ответят следующие запросы, например [429]
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def _call(self, name, *args):
+        with self._lock:
+            self.calls.append((name, *args))
+            if self.failures:
+                raise api_error(self.failures.pop(0))
+
+    def update_cell(self, row, col, value):
+        self._call('update_cell', row, col, value)
+        self.cells[(row, col)] = value
+
+    def batch_update(self, data, **kwargs):
+        self._call('batch_update', data)
+        for update in data:
+            row, col = a1_to_rowcol(update['range'].split(':')[0])
+            for i, values in enumerate(update['values']):
+                for j, value in enumerate(values):
+                    self.cells[(row + i, col + j)] = value
+
+    def get_all_values(self, **kwargs):
+        self._call('get_all_values')
+        if not self.cells:
+            return []
+        rows = max(row for row, _ in self.cells)
+        cols = max(col for _, col in self.cells)
+        return [[str(self.cells.get((row, col), '')) for col in range(1, cols + 1)]
+                for row in range(1, rows + 1)]
+
+
+class FakeSpreadsheet:
+    def __init__(self, title):
+        self.title = title
+        self.sheet1 = FakeWorksheet()
+
+    def get_worksheet(self, index):
+        return self.sheet1
+
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheets = {}
+        self.opened = 0
+
+    def open(self, title):
+        self.opened += 1
+        if title not in self.spreadsheets:
+            self.spreadsheets[title] = FakeSpreadsheet(title)
+        return self.spreadsheets[title]
+
+
+client = FakeClient()
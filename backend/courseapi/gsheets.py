@@ -0,0 +1,158 @@
+import logging
+import threading
+
+import gspread
+from gspread.utils import rowcol_to_a1
+from django.conf import settings
+
+from backend.settings import env
+
+from .models import Homework
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = 429
+
+
+def hw_col(task):
+    return int(env('FIRST_TASK_COL')) + (task - 1) * 2
+
+
+def mark_col(task):
+    return hw_col(task) + 1
+
+
+def open_worksheet():
+    if settings.GSHEETS_FAKE:
+        from .fake_gspread import client
+    else:
+        client = gspread.service_account(filename=settings.GSHEET_CREDS)
+    return client.open(env('SPREADSHEET')).get_worksheet(0)
+
+
+class SheetWriter:
+    '''
+    Пишет в гугл таблицу из воркера селери. Клиент и лист открываются один раз на процесс,
+    записи копятся window секунд (по ячейке остаётся только последнее значение)
+    и уходят одним batch_update.
+    '''
+
+    def __init__(self, opener=open_worksheet, window=None):
+        self._opener = opener
+        self._window = settings.GSHEETS_FLUSH_WINDOW if window is None else window
+        self._worksheet = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def worksheet(self):
+        if self._worksheet is None:
+            self._worksheet = self._opener()
+        return self._worksheet
+
+    def write(self, row, col, value):
+        if row is None:
+            return
+        with self._lock:
+            self._pending[(row, col)] = value
+            self._schedule()
+        if self._window <= 0:
+            self.flush()
+
+    def _schedule(self):
+        if self._timer is None and self._window > 0:
+            self._timer = threading.Timer(self._window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        '''отправляет накопленное, возвращает число записанных ячеек'''
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        updates = [{'range': rowcol_to_a1(row, col), 'values': [[value]]}
+                   for (row, col), value in sorted(pending.items())]
+        try:
+            self.worksheet.batch_update(updates)
+        except gspread.exceptions.APIError as error:
+            self._requeue(pending)
+            if error.response.status_code != RATE_LIMITED:
+                # после ошибки клиент мог протухнуть, переоткроем его при следующей записи
+                self._worksheet = None
+                logger.error(error)
+            return 0
+        except Exception:
+            self._requeue(pending)
+            self._worksheet = None
+            raise
+        return len(updates)
+
+    def _requeue(self, pending):
+        '''возвращает неотправленное в буфер, не затирая более свежие записи'''
+        with self._lock:
+            self._pending = {**pending, **self._pending}
+            self._schedule()
+
+
+writer = SheetWriter()
+
+
+def _cell(values, row, col):
+    if row <= len(values) and col <= len(values[row - 1]):
+        return values[row - 1][col - 1].strip()
+    return ''
+
+
+def _same_mark(cell, mark):
+    try:
+        return abs(float(cell.replace(',', '.')) - mark) < 1e-9
+    except ValueError:
+        return False
+
+
+def reconcile(dry_run=False):
+    '''
+    Сверяет таблицу с базой: лист читается одним get_all_values, дз - одним запросом,
+    расхождения дописываются одним batch_update. Источник правды - база, поэтому ячейки,
+    заполненные только в таблице, не стираются, а лишь попадают в отчёт.
+    '''
+    # сначала дописываем то, что уже лежит в буфере процесса
+    writer.flush()
+    values = writer.worksheet.get_all_values()
+
+    report = {'homeworks': 0, 'urls': 0, 'marks': 0, 'sheet_only': 0, 'written': 0, 'cells': []}
+    updates = []
+    homeworks = (Homework.objects.filter(owner__gsheets_id__isnull=False)
+                                 .values_list('owner__gsheets_id', 'task_id', 'url', 'mark')
+                                 .order_by('owner__gsheets_id', 'task_id'))
+    for row, task, url, mark in homeworks.iterator(chunk_size=2000):
+        report['homeworks'] += 1
+        col = hw_col(task)
+        if _cell(values, row, col) != url:
+            report['urls'] += 1
+            updates.append({'range': rowcol_to_a1(row, col), 'values': [[url]]})
+
+        col = mark_col(task)
+        cell = _cell(values, row, col)
+        if mark is None:
+            if cell:
+                report['sheet_only'] += 1
+        elif not _same_mark(cell, mark):
+            report['marks'] += 1
+            updates.append({'range': rowcol_to_a1(row, col), 'values': [[mark]]})
+
+    report['cells'] = [update['range'] for update in updates]
+    if updates and not dry_run:
+        writer.worksheet.batch_update(updates)
+        report['written'] = len(updates)
+    return report
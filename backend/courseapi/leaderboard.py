@@ -0,0 +1,147 @@
+import logging
+
+import redis
+from django.conf import settings
+
+from .models import Statistic
+
+logger = logging.getLogger(__name__)
+
+client = redis.Redis.from_url(settings.LEADERBOARD_REDIS_URL)
+
+GLOBAL_KEY = 'leaderboard'
+READY_KEY = 'leaderboard:ready'
+
+# score = (passed + 1) * 10^10 + average * 10^3 * 10^5 + project * 10^3,
+# так порядок ZSET совпадает с order_by('-passed', '-average', '-project')
+PASSED_WEIGHT = 10 ** 10
+AVERAGE_WEIGHT = 10 ** 5
+# в postgres NULL при сортировке по убыванию идёт первым
+NO_PROJECT = AVERAGE_WEIGHT - 1
+
+
+def tutor_key(tutor):
+    return f'leaderboard:tutor:{tutor}'
+
+
+def score(passed, average, project):
+    project_part = NO_PROJECT if project is None else round(project * 1000)
+    return (passed + 1) * PASSED_WEIGHT + round(average * 1000) * AVERAGE_WEIGHT + project_part
+
+
+def unpack(username, value):
+    value = int(value)
+    project = value % AVERAGE_WEIGHT
+    return {
+        'username': username,
+        'passed': value // PASSED_WEIGHT - 1,
+        'average': value % PASSED_WEIGHT // AVERAGE_WEIGHT / 1000,
+        'project': None if project == NO_PROJECT else project / 1000,
+    }
+
+
+def update(username, tutor, passed, average, project):
+    update_many([(username, tutor, passed, average, project)])
+
+
+def update_many(rows):
+    '''rows - (username, tutor, passed, average, project), все записываются одним пайплайном'''
+    try:
+        pipe = client.pipeline()
+        for username, tutor, passed, average, project in rows:
+            value = score(passed, average, project)
+            pipe.zadd(GLOBAL_KEY, {username: value})
+            if tutor:
+                pipe.zadd(tutor_key(tutor), {username: value})
+        pipe.execute()
+    except redis.RedisError as error:
+        logger.error(error)
+        _mark_stale()
+
+
+def move(username, old_tutor, tutor, passed, average, project):
+    '''студент сменил ментора: запись уходит из рейтинга старого ментора в рейтинг нового'''
+    try:
+        pipe = client.pipeline()
+        if old_tutor:
+            pipe.zrem(tutor_key(old_tutor), username)
+        value = score(passed, average, project)
+        pipe.zadd(GLOBAL_KEY, {username: value})
+        if tutor:
+            pipe.zadd(tutor_key(tutor), {username: value})
+        pipe.execute()
+    except redis.RedisError as error:
+        logger.error(error)
+        _mark_stale()
+
+
+def remove(username, tutor):
+    try:
+        pipe = client.pipeline()
+        pipe.zrem(GLOBAL_KEY, username)
+        if tutor:
+            pipe.zrem(tutor_key(tutor), username)
+        pipe.execute()
+    except redis.RedisError as error:
+        logger.error(error)
+        _mark_stale()
+
+
+def _mark_stale():
+    '''
+    запись в ZSET не прошла, поэтому рейтинг читается из базы, пока его не пересоберёт
+    задача rebuild_leaderboard. Если редис лежит целиком, top() и так уходит в базу
+    '''
+    try:
+        client.delete(READY_KEY)
+    except redis.RedisError as error:
+        logger.error(error)
+
+
+def top(limit, tutor=None):
+    '''лучшие limit студентов из ZSET или None, если рейтинг ещё не собран и надо идти в базу'''
+    try:
+        pipe = client.pipeline()
+        pipe.exists(READY_KEY)
+        pipe.zrevrange(tutor_key(tutor) if tutor else GLOBAL_KEY, 0, limit - 1, withscores=True)
+        ready, rows = pipe.execute()
+    except redis.RedisError as error:
+        logger.error(error)
+        return None
+    if not ready:
+        return None
+    return [unpack(username.decode(), value) for username, value in rows]
+
+
+def rebuild(chunk_size=2000):
+    '''пересобирает все рейтинги из Statistic во временные ключи и атомарно подменяет ими текущие'''
+    statistics = (Statistic.objects
+                  .values_list('student__username', 'tutor__username', 'passed', 'average', 'project')
+                  .order_by('id'))
+    keys = set()
+    pipe = client.pipeline(transaction=False)
+    count = 0
+    for username, tutor, passed, average, project in statistics.iterator(chunk_size=chunk_size):
+        value = score(passed, average, project)
+        pipe.zadd(GLOBAL_KEY + ':rebuild', {username: value})
+        keys.add(GLOBAL_KEY)
+        if tutor:
+            pipe.zadd(tutor_key(tutor) + ':rebuild', {username: value})
+            keys.add(tutor_key(tutor))
+        count += 1
+        if count % chunk_size == 0:
+            pipe.execute()
+    pipe.execute()
+
+    stale = {key.decode() for key in client.scan_iter(match=tutor_key('*'))} - keys
+    pipe = client.pipeline()
+    if not keys:
+        pipe.delete(GLOBAL_KEY)
+    for key in keys:
+        pipe.rename(key + ':rebuild', key)
+    for key in stale:
+        if not key.endswith(':rebuild'):
+            pipe.delete(key)
+    pipe.set(READY_KEY, 1)
+    pipe.execute()
+    return count
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, RequestFactory, override_settings
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.request import Request
+
+from courseapi.renderers import JSONOnlyNegotiation, ORJSONParser, ORJSONRenderer
+
+# то, что было в settings.MIDDLEWARE до внутреннего профиля api
+FULL_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+
+def per_call(function, repeat):
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 10 ** 6
+
+
+class Command(BaseCommand):
+    help = ('Меряет накладные расходы на запрос к внутреннему api: полный список middleware '
+            'против урезанного, стандартные json рендерер/парсер и согласование DRF против orjson')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--rows', type=int, default=200, help='строк в ответе для замера рендера')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f'мкс на вызов, {repeat} повторов')
+
+        def request(client):
+            return lambda: client.get('/api/v1/test', HTTP_HOST='localhost')
+
+        with override_settings(MIDDLEWARE=FULL_MIDDLEWARE):
+            full = per_call(request(Client()), repeat)
+        lean = per_call(request(Client()), repeat)
+        self.compare('middleware', full, lean)
+
+        rows = [{'username': f'student-{i}', 'passed': i % 12, 'average': 7.25, 'project': None}
+                for i in range(options['rows'])]
+        self.compare(f"рендер {options['rows']} строк",
+                     per_call(lambda: JSONRenderer().render(rows), repeat),
+                     per_call(lambda: ORJSONRenderer().render(rows), repeat))
+
+        body = ORJSONRenderer().render({'marks': [{'student': 'student', 'task': 1, 'mark': 8}] * 50})
+        factory = RequestFactory()
+
+        def parse(parser):
+            return lambda: parser.parse(factory.put('/', body, content_type='application/json'))
+
+        self.compare('разбор 50 оценок', per_call(parse(JSONParser()), repeat), per_call(parse(ORJSONParser()), repeat))
+
+        # aiohttp по умолчанию шлёт Accept: */*
+        drf_request = Request(factory.get('/api/v1/timetable', HTTP_ACCEPT='*/*'))
+        renderers = [JSONRenderer(), BrowsableAPIRenderer()]
+        self.compare('согласование',
+                     per_call(lambda: DefaultContentNegotiation().select_renderer(drf_request, renderers), repeat),
+                     per_call(lambda: JSONOnlyNegotiation().select_renderer(drf_request, [ORJSONRenderer()]), repeat))
+
+    def compare(self, title, before, after):
+        self.stdout.write(f'{title:>20}: {before:9.1f} -> {after:9.1f} (-{before - after:.1f})')
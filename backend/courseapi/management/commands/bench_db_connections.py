@@ -0,0 +1,70 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from backend.db_pool import pool as db_pool
+from courseapi.models import Member
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        'avg': statistics.fmean(latencies) * 1000,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку запроса, который открывает соединение с postgres заново, '
+            'и запроса, который берёт его из пула (ENGINE backend.db_pool)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='запросов на каждый режим')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='параллельных потоков, больше размера пула - чтобы увидеть ожидание')
+
+    def handle(self, *args, **options):
+        if connection.settings_dict['ENGINE'] != 'backend.db_pool':
+            raise CommandError('пул выключен (DB_POOL=False), сравнивать не с чем')
+
+        def request(fresh):
+            # один запрос бота: соединение на время запроса, как между request_started и request_finished
+            started = time.perf_counter()
+            Member.objects.values('role').first()
+            connection.close()
+            if fresh:
+                # без пула соединение закрылось бы по-настоящему, и следующий запрос открыл бы новое
+                db_pool.close_all()
+            return time.perf_counter() - started
+
+        for fresh, title in ((True, 'новое соединение'), (False, 'из пула')):
+            latencies = self.run(request, fresh, options['requests'], options['threads'])
+            result = summary(latencies)
+            self.stdout.write(f"{title:>17}: avg {result['avg']:.2f} мс, p50 {result['p50']:.2f} мс, "
+                              f"p95 {result['p95']:.2f} мс")
+            if fresh:
+                cold = result['avg']
+        self.stdout.write(self.style.SUCCESS(f"Пул экономит {cold - result['avg']:.2f} мс на запрос"))
+        for pool in db_pool.stats():
+            self.stdout.write(', '.join(f'{key}={value}' for key, value in pool.items()))
+
+    def run(self, request, fresh, requests, threads):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(count):
+            measured = [request(fresh) for _ in range(count)]
+            with lock:
+                latencies.extend(measured)
+
+        workers = [threading.Thread(target=worker, args=(requests // threads + (i < requests % threads),))
+                   for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies
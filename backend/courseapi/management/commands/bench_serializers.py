@@ -0,0 +1,78 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from courseapi.models import Member, Homework, Task, Statistic
+from courseapi.serializers import (HomeworkListSerializer, HomeworkListValuesSerializer,
+                                   StatisticSerializer, StatisticValuesSerializer,
+                                   StudentPlainSerializer, StudentPlainValuesSerializer,
+                                   TaskPlainSerializer, TaskPlainValuesSerializer)
+
+
+def rows_per_second(function, rows, repeat):
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return rows * repeat / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ModelSerializer и values_list()-сериализаторы горячих списков в строках в секунду. '
+            'Тестовые строки создаются в транзакции, которая потом откатывается')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            tutor = self.fill(rows)
+            cases = [
+                ('students', StudentPlainSerializer, StudentPlainValuesSerializer,
+                 Member.objects.filter(tutor=tutor).order_by('username')),
+                ('homeworks', HomeworkListSerializer, HomeworkListValuesSerializer,
+                 Homework.objects.filter(owner__tutor=tutor).order_by('id')),
+                ('tasks', TaskPlainSerializer, TaskPlainValuesSerializer, Task.objects.order_by('id')),
+                ('statistic', StatisticSerializer, StatisticValuesSerializer,
+                 Statistic.objects.filter(tutor=tutor).annotate(username=F('student__username')).order_by('id')),
+            ]
+            self.stdout.write(f'{rows} строк, {repeat} повторов, строк/с')
+            self.stdout.write(f"{'':>10} {'модели':>12} {'values':>12} {'x':>6} "
+                              f"{'только сериализация':>22} {'x':>6}")
+            for title, model_serializer, values_serializer, queryset in cases:
+                self.compare(title, model_serializer, values_serializer, queryset, repeat)
+            transaction.set_rollback(True)
+
+    def fill(self, rows):
+        today = datetime.date.today()
+        tutor = Member.objects.create(username='bench-serializers-tutor', role=Member.Role.TUTOR)
+        students = Member.objects.bulk_create(
+            [Member(username=f'bench-serializers-{i}', tutor=tutor) for i in range(rows)], batch_size=2000)
+        Statistic.objects.bulk_create(
+            [Statistic(student=student, tutor=tutor, passed=i % 12, average=i % 100 / 10,
+                       project=None if i % 3 else 8.5) for i, student in enumerate(students)], batch_size=2000)
+        tasks = Task.objects.bulk_create([Task(start_date=today, end_date=today) for _ in range(rows)], batch_size=2000)
+        Homework.objects.bulk_create(
+            [Homework(owner=student, task=task, url=f'https://figma.com/{i}', mark=None if i % 2 else 7.5)
+             for i, (student, task) in enumerate(zip(students, tasks))], batch_size=2000)
+        return tutor
+
+    def compare(self, title, model_serializer, values_serializer, queryset, repeat):
+        count = queryset.count()
+        values = values_serializer.values_list(queryset)
+        # вместе с запросом в базу: так список отдаёт view
+        before = rows_per_second(lambda: model_serializer(list(queryset), many=True).data, count, repeat)
+        after = rows_per_second(lambda: values_serializer(list(values)).data, count, repeat)
+
+        # без базы: только превращение уже полученных строк в словари ответа
+        instances, tuples = list(queryset), list(values)
+        before_only = rows_per_second(lambda: model_serializer(instances, many=True).data, count, repeat)
+        after_only = rows_per_second(lambda: values_serializer(tuples).data, count, repeat)
+
+        self.stdout.write(f'{title:>10} {before:>12,.0f} {after:>12,.0f} {after / before:>6.1f} '
+                          f'{before_only:>11,.0f} -> {after_only:>8,.0f} {after_only / before_only:>6.1f}')
@@ -0,0 +1,92 @@
+import itertools
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from courseapi.models import Member
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный бэкенд частыми запросами бота (whoami, timetable, homeworks, '
+            'groupedhwinfo, statistic) на нескольких уровнях параллельности. Чтобы сравнить режимы, '
+            'запустите его против GUNICORN_WORKER_CLASS=sync и против uvicorn с одинаковым WEB_CONCURRENCY')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='адрес бэкенда')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100, 200],
+                            help='сколько запросов держать в полёте одновременно')
+        parser.add_argument('--duration', type=float, default=10, help='секунд на каждый уровень')
+        parser.add_argument('--users', type=int, default=50, help='сколько участников из базы взять для запросов')
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        paths = self.paths(options['users'])
+        if not paths:
+            raise CommandError('в базе нет участников, запросам не к кому обращаться')
+        self.stdout.write(f"{options['url']}: {len(paths)} разных запросов, по {options['duration']:.0f} с на уровень")
+        self.stdout.write(f"{'параллельно':>11} {'rps':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'ошибки':>7}")
+        for concurrency in options['concurrency']:
+            result = self.run(options['url'], paths, concurrency, options['duration'], options['timeout'])
+            self.stdout.write(f"{concurrency:>11} {result['rps']:>8.0f} {result['p50']:>8.1f} "
+                              f"{result['p95']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}")
+
+    def paths(self, users):
+        members = list(Member.objects.order_by('id').values_list('username', 'role')[:users])
+        students = [username for username, role in members if role == Member.Role.STUDENT]
+        tutors = [username for username, role in members if role == Member.Role.TUTOR]
+        paths = ['/api/v1/timetable', '/api/v1/statistic/10']
+        paths += [f'/api/v1/{username}/whoami' for username, _ in members]
+        paths += [f'/api/v1/{username}/homeworks' for username in students]
+        paths += [f'/api/v1/{username}/groupedhwinfo' for username in tutors]
+        paths += [f'/api/v1/{username}/statistic/10' for username in tutors]
+        random.shuffle(paths)
+        return paths if members else []
+
+    def run(self, url, paths, concurrency, duration, timeout):
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        local = threading.local()
+        deadline = time.monotonic() + duration
+        counter = itertools.count()
+
+        def worker():
+            nonlocal errors
+            # у каждого потока своя сессия, чтобы соединения переиспользовались как у бота
+            local.session = requests.Session()
+            while time.monotonic() < deadline:
+                path = paths[next(counter) % len(paths)]
+                started = time.perf_counter()
+                try:
+                    ok = local.session.get(url + path, timeout=timeout).status_code < 500
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    errors += not ok
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        if not latencies:
+            return {'rps': 0, 'p50': 0, 'p95': 0, 'p99': 0, 'errors': errors}
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'errors': errors,
+        }
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courseapi import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает рейтинги студентов в редисе из таблицы Statistic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = leaderboard.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'В рейтинг загружено студентов: {count}'))
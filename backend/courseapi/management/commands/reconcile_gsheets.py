@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courseapi import gsheets
+
+
+class Command(BaseCommand):
+    help = 'Сверяет гугл таблицу с базой и дописывает в неё расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='только показать расхождения')
+        parser.add_argument('--show', type=int, default=20, help='сколько ячеек с расхождениями вывести')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        report = gsheets.reconcile(dry_run=options['dry_run'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(f"Проверено дз: {report['homeworks']}")
+        self.stdout.write(f"Расходятся ссылки: {report['urls']}, оценки: {report['marks']}")
+        self.stdout.write(f"Оценки есть только в таблице: {report['sheet_only']}")
+        if report['cells'] and options['show']:
+            cells = report['cells'][:options['show']]
+            more = len(report['cells']) - len(cells)
+            self.stdout.write('Ячейки: ' + ', '.join(cells) + (f' и ещё {more}' if more else ''))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Ничего не записано (--dry-run), {elapsed:.1f} с'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Записано ячеек: {report['written']}, {elapsed:.1f} с"))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courseapi', '0002_task_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='chat_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
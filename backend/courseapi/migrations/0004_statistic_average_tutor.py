@@ -0,0 +1,43 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_average_and_tutor(apps, schema_editor):
+    Statistic = apps.get_model('courseapi', 'Statistic')
+    Member = apps.get_model('courseapi', 'Member')
+    Statistic.objects.filter(passed__gt=0).update(average=F('sum') / F('passed'))
+    Statistic.objects.update(
+        tutor_id=Subquery(Member.objects.filter(pk=OuterRef('student_id')).values('tutor_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courseapi', '0003_member_chat_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistic',
+            name='average',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statistic',
+            name='tutor',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courseapi.member'),
+        ),
+        migrations.RunPython(fill_average_and_tutor, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['-passed', '-average', '-project'], name='statistic_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['tutor', '-passed', '-average', '-project'], name='statistic_tutor_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_homeworks(apps, schema_editor):
+    Homework = apps.get_model('courseapi', 'Homework')
+    duplicates = (Homework.objects.values('owner_id', 'task_id')
+                  .annotate(last_id=Max('id'), kol=Count('id'))
+                  .filter(kol__gt=1))
+    for duplicate in duplicates:
+        (Homework.objects.filter(owner_id=duplicate['owner_id'], task_id=duplicate['task_id'])
+         .exclude(id=duplicate['last_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courseapi', '0004_statistic_average_tutor'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_homeworks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='homework',
+            constraint=models.UniqueConstraint(fields=('owner', 'task'), name='homework_owner_task_uniq'),
+        ),
+    ]
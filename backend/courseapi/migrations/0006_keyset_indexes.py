@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courseapi', '0005_homework_owner_task_uniq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['tutor', 'username'], name='member_tutor_username_idx'),
+        ),
+        # id в конце индекса - однозначный порядок для постраничной выдачи рейтинга
+        migrations.RemoveIndex(
+            model_name='statistic',
+            name='statistic_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['-passed', '-average', '-project', 'id'], name='statistic_rank_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='statistic',
+            name='statistic_tutor_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['tutor', '-passed', '-average', '-project', 'id'],
+                               name='statistic_tutor_rank_idx'),
+        ),
+    ]
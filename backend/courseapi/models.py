@@ -10,8 +10,15 @@ class Member(models.Model):
     username = models.SlugField(unique=True, db_index=True)
     role = models.IntegerField(choices=Role.choices, default=Role.STUDENT)
     gsheets_id = models.IntegerField(null=True)
+    chat_id = models.BigIntegerField(null=True)
     tutor = models.ForeignKey('Member', on_delete=models.SET_NULL, related_name='students', null=True)
 
+    class Meta:
+        indexes = [
+            # списки студентов ментора листаются по username
+            models.Index(fields=['tutor', 'username'], name='member_tutor_username_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -19,6 +26,7 @@ class Member(models.Model):
 class Task(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
+    updated = models.DateTimeField(auto_now=True)
 
 
 class Homework(models.Model):
@@ -27,9 +35,24 @@ class Homework(models.Model):
     owner = models.ForeignKey('Member', on_delete=models.CASCADE, related_name='hws')
     task = models.ForeignKey('Task', on_delete=models.CASCADE, related_name='hws')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'task'], name='homework_owner_task_uniq'),
+        ]
+
 
 class Statistic(models.Model):
     sum = models.FloatField(default=0)
     passed = models.IntegerField(default=-1)
+    average = models.FloatField(default=0)
     project = models.FloatField(null=True)
     student = models.OneToOneField('Member', on_delete=models.CASCADE, related_name='statistic')
+    # копия student.tutor, чтобы рейтинг ментора читался одним индексом. Синхронизируется
+    # сигналом в signals.py, поэтому ментора меняют через Member.save(), а не queryset.update()
+    tutor = models.ForeignKey('Member', on_delete=models.SET_NULL, related_name='+', null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-passed', '-average', '-project', 'id'], name='statistic_rank_idx'),
+            models.Index(fields=['tutor', '-passed', '-average', '-project', 'id'], name='statistic_tutor_rank_idx'),
+        ]
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Постраничная выдача по ключу сортировки: следующая страница начинается строго после
+    последней строки предыдущей, поэтому каждая страница - это один проход по индексу
+    и размер ответа не зависит от того, насколько далеко пролистали.
+    '''
+    ordering = ('id',)
+    # поля, которые могут быть NULL; в postgres NULL считается больше любого значения
+    nullable = ()
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        rows = list(queryset[:page_size + 1])
+        self.next_position = self.position(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_position),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def position(self, row):
+        if isinstance(row, tuple):
+            # строка values_list(): поля сортировки добавлены в конец, см. cursor_fields
+            return list(row[-len(self.ordering):])
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    @classmethod
+    def cursor_fields(cls):
+        '''поля, которые надо дописать в конец values_list(), чтобы построить курсор'''
+        return [field.lstrip('-') for field in cls.ordering]
+
+    def after(self, position):
+        '''условие "строго после position" для сортировки self.ordering'''
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if value is None:
+                # по убыванию NULL идут первыми, за ними все значения, по возрастанию - последними
+                if descending:
+                    condition |= equal & Q(**{f'{name}__isnull': False})
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            later = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+            if name in self.nullable and not descending:
+                later |= Q(**{f'{name}__isnull': True})
+            condition |= equal & later
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position):
+        if position is None:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+class StudentListPagination(KeysetPagination):
+    ordering = ('username',)
+    page_size = 16
+
+
+class StatisticPagination(KeysetPagination):
+    ordering = ('-passed', '-average', '-project', 'id')
+    nullable = ('project',)
+
+    def get_page_size(self, request):
+        # в рейтинге размер страницы задаётся в пути: /statistic/<limit>
+        return min(max(self.view.kwargs['limit'], 1), self.max_page_size)
@@ -0,0 +1,163 @@
+import csv
+import json
+
+from django.db import IntegrityError, transaction
+
+from . import caching, leaderboard
+from .models import Member, Statistic
+from .serializers import MemberImportSerializer
+
+CHUNK_SIZE = 500
+
+
+def read_csv(lines):
+    '''строки csv с заголовком username,role,tutor,gsheets_id -> (номер строки, данные)'''
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {key: value.strip() for key, value in row.items()
+                                if key and value and value.strip()}
+
+
+def read_json_lines(lines):
+    '''по одному json объекту на строку -> (номер строки, данные или текст ошибки)'''
+    for line_num, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            yield line_num, f'некорректный json: {error}'
+            continue
+        yield line_num, data if isinstance(data, dict) else 'ожидался json объект'
+
+
+READERS = {
+    'text/csv': read_csv,
+    'application/x-ndjson': read_json_lines,
+    'application/jsonl': read_json_lines,
+}
+
+
+class RosterImport:
+    '''
+    Потоковый импорт участников: строки валидируются по одной, а в базу пишутся пачками
+    по chunk_size через bulk_create. Менторы из файла должны идти раньше своих студентов.
+    '''
+
+    def __init__(self, dry_run=False, chunk_size=None):
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        # менторов немного, поэтому все они достаются одним запросом заранее
+        self.tutors = dict(Member.objects.filter(role=Member.Role.TUTOR).values_list('username', 'id'))
+        self.seen = set()
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        chunk = []
+        for line, data in rows:
+            row = self.validate(line, data)
+            if row is None:
+                continue
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = []
+        self.flush(chunk)
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+    def error(self, line, username, errors):
+        self.errors.append({'line': line, 'username': username, 'errors': errors})
+
+    def validate(self, line, data):
+        if isinstance(data, str):
+            self.error(line, None, {'non_field_errors': [data]})
+            return None
+        serializer = MemberImportSerializer(data=data)
+        if not serializer.is_valid():
+            self.error(line, data.get('username'), serializer.errors)
+            return None
+        row = serializer.validated_data
+        username, tutor = row['username'], row.get('tutor')
+        if username in self.seen:
+            self.error(line, username, {'username': ['повторяется в файле']})
+            return None
+        if tutor and tutor not in self.tutors:
+            self.error(line, username, {'tutor': ['нет такого ментора']})
+            return None
+        self.seen.add(username)
+        if row['role'] == Member.Role.TUTOR:
+            # id появится после вставки, до этого студенты уже могут на него ссылаться
+            self.tutors.setdefault(username, None)
+        return row
+
+    def reject(self, line, row, errors):
+        self.error(line, row['username'], errors)
+        if row['role'] == Member.Role.TUTOR and self.tutors.get(row['username']) is None:
+            self.tutors.pop(row['username'], None)
+
+    def flush(self, chunk):
+        if not chunk:
+            return
+        existing = set(Member.objects.filter(username__in=[row['username'] for _, row in chunk])
+                                     .values_list('username', flat=True))
+        rows = []
+        for line, row in chunk:
+            if row['username'] in existing:
+                self.reject(line, row, {'username': ['участник уже существует']})
+            else:
+                rows.append((line, row))
+        if self.dry_run:
+            self.created += len(rows)
+            return
+
+        reported = len(self.errors)
+        try:
+            with transaction.atomic():
+                self.created += self.insert(rows)
+        except IntegrityError:
+            # кто-то успел добавить участника между проверкой и вставкой, вся пачка откатилась
+            del self.errors[reported:]
+            for line, row in rows:
+                self.error(line, row['username'], {'non_field_errors': ['конфликт при вставке, повторите импорт']})
+                if row['role'] == Member.Role.TUTOR:
+                    self.tutors.pop(row['username'], None)
+
+    def insert(self, rows):
+        staff = [(line, row) for line, row in rows if row['role'] != Member.Role.STUDENT]
+        students = [(line, row) for line, row in rows if row['role'] == Member.Role.STUDENT]
+
+        created = Member.objects.bulk_create([self.member(row) for _, row in staff])
+        self.tutors.update((member.username, member.id) for member in created if member.role == Member.Role.TUTOR)
+
+        ready = []
+        for line, row in students:
+            if row.get('tutor') and self.tutors.get(row['tutor']) is None:
+                self.reject(line, row, {'tutor': ['ментор не был создан']})
+            else:
+                ready.append(row)
+        members = Member.objects.bulk_create([self.member(row) for row in ready])
+        statistics = Statistic.objects.bulk_create([
+            Statistic(student_id=member.id, tutor_id=member.tutor_id) for member in members
+        ])
+
+        entries = [(row['username'], row.get('tutor'), statistic.passed, statistic.average, statistic.project)
+                   for row, statistic in zip(ready, statistics)]
+        transaction.on_commit(lambda: leaderboard.update_many(entries))
+        caching.members_created(row.get('tutor') for row in ready)
+        return len(created) + len(members)
+
+    def member(self, row):
+        tutor = row.get('tutor')
+        return Member(
+            username=row['username'],
+            role=row['role'],
+            gsheets_id=row.get('gsheets_id'),
+            tutor_id=self.tutors[tutor] if tutor else None,
+        )
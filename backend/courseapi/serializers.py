@@ -1,13 +1,51 @@
+from django.db.models import F
 from rest_framework import serializers
 from .models import Member, Homework, Task, Statistic
 
 
+class ValuesSerializer:
+    '''
+    Сериализатор только на чтение для горячих списков: строки приходят кортежами из
+    values_list() по схеме fields и сразу складываются в словари ответа, без моделей
+    и полей DRF на каждую строку. Лишние столбцы в конце кортежа (например, поля
+    сортировки для курсора пагинации) в ответ не попадают.
+    '''
+    # имя в ответе -> поле для values_list()
+    fields = {}
+
+    def __init__(self, instance=None, many=True, **kwargs):
+        self.instance = instance
+
+    @classmethod
+    def values_list(cls, queryset, *extra):
+        return queryset.values_list(*cls.fields.values(), *(F(field) for field in extra))
+
+    @property
+    def data(self):
+        names = tuple(self.fields)
+        return [dict(zip(names, row)) for row in self.instance]
+
+
 class MemberSerializer(serializers.ModelSerializer):
     class Meta:
         model = Member
         fields = '__all__'
 
 
+class MemberChatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Member
+        fields = ('chat_id',)
+        extra_kwargs = {'chat_id': {'required': True, 'allow_null': False}}
+
+
+class MemberImportSerializer(serializers.Serializer):
+    username = serializers.SlugField(max_length=50)
+    role = serializers.ChoiceField(choices=Member.Role.choices, default=Member.Role.STUDENT)
+    tutor = serializers.SlugField(max_length=50, required=False)
+    gsheets_id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
 class MemberRoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Member
@@ -20,22 +58,48 @@ class StudentPlainSerializer(serializers.ModelSerializer):
         fields = ('username',)
 
 
+class StudentPlainValuesSerializer(ValuesSerializer):
+    fields = {'username': 'username'}
+
+
 class HomeworkListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Homework
         fields = ('task', 'url', 'mark')
 
 
-class HomeworkSendSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Homework
-        fields = ('owner', 'task', 'url')
+class HomeworkListValuesSerializer(ValuesSerializer):
+    fields = {'task': 'task_id', 'url': 'url', 'mark': 'mark'}
 
 
-class HomeworkCheckSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Homework
-        fields = ('mark',)
+class HomeworkSubmitSerializer(serializers.Serializer):
+    task = serializers.IntegerField(min_value=1)
+    url = serializers.URLField(max_length=255)
+
+
+class HomeworkCheckSerializer(serializers.Serializer):
+    task = serializers.IntegerField(min_value=1)
+    mark = serializers.FloatField(min_value=0, max_value=10)
+
+
+class HomeworkMarkSerializer(serializers.Serializer):
+    student = serializers.SlugField()
+    task = serializers.IntegerField(min_value=1)
+    mark = serializers.FloatField(min_value=0, max_value=10)
+
+
+class HomeworkBulkCheckSerializer(serializers.Serializer):
+    MAX_MARKS = 200
+
+    marks = HomeworkMarkSerializer(many=True, allow_empty=False)
+
+    def validate_marks(self, marks):
+        if len(marks) > self.MAX_MARKS:
+            raise serializers.ValidationError(f'не больше {self.MAX_MARKS} оценок за раз')
+        pairs = {(mark['student'], mark['task']) for mark in marks}
+        if len(pairs) != len(marks):
+            raise serializers.ValidationError('одно дз оценено несколько раз')
+        return marks
 
 
 class HomeworkGroupedSerializer(serializers.Serializer):
@@ -46,7 +110,12 @@ class HomeworkGroupedSerializer(serializers.Serializer):
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = '__all__'
+        fields = ('id', 'start_date', 'end_date')
+
+
+class TaskValuesSerializer(ValuesSerializer):
+    # даты остаются объектами date, в json они попадают в том же виде YYYY-MM-DD
+    fields = {'id': 'id', 'start_date': 'start_date', 'end_date': 'end_date'}
 
 
 class TaskPlainSerializer(serializers.ModelSerializer):
@@ -55,10 +124,32 @@ class TaskPlainSerializer(serializers.ModelSerializer):
         fields = ('id',)
 
 
+class TaskPlainValuesSerializer(ValuesSerializer):
+    fields = {'id': 'id'}
+
+
 class StatisticSerializer(serializers.ModelSerializer):
     username = serializers.SlugField()
-    average = serializers.FloatField()
 
     class Meta:
         model = Statistic
-        exclude = ('id', 'sum')
+        fields = ('username', 'passed', 'average', 'project')
+
+
+class StatisticValuesSerializer(ValuesSerializer):
+    fields = {'username': 'student__username', 'passed': 'passed', 'average': 'average', 'project': 'project'}
+
+
+class StatisticCardSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Statistic
+        fields = ('passed', 'average', 'project')
+
+
+class StudentCardSerializer(serializers.ModelSerializer):
+    homeworks = HomeworkListSerializer(source='hws', many=True)
+    statistic = StatisticCardSerializer()
+
+    class Meta:
+        model = Member
+        fields = ('username', 'homeworks', 'statistic')
@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, leaderboard
+from .models import Member, Statistic
+
+
+@receiver(pre_save, sender=Member)
+def remember_tutor(sender, instance, **kwargs):
+    # ментора можно сменить только через save() (админка, shell), при создании сравнивать не с чем
+    instance._saved_tutor_id = (Member.objects.filter(pk=instance.pk).values_list('tutor_id', flat=True).first()
+                                if instance.pk else None)
+
+
+@receiver(post_save, sender=Member)
+def sync_statistic_tutor(sender, instance, created, **kwargs):
+    '''Statistic.tutor - копия Member.tutor, поэтому при смене ментора переезжают и строка рейтинга, и ZSET'''
+    old_tutor_id = getattr(instance, '_saved_tutor_id', None)
+    if created or old_tutor_id == instance.tutor_id:
+        return
+    Statistic.objects.filter(student_id=instance.pk).update(tutor_id=instance.tutor_id)
+    statistic = (Statistic.objects.filter(student_id=instance.pk)
+                                  .values_list('passed', 'average', 'project').first())
+    usernames = dict(Member.objects.filter(pk__in=[old_tutor_id, instance.tutor_id]).values_list('id', 'username'))
+    old_tutor, tutor = usernames.get(old_tutor_id), usernames.get(instance.tutor_id)
+    if statistic is not None:
+        transaction.on_commit(lambda: leaderboard.move(instance.username, old_tutor, tutor, *statistic))
+    caching.invalidate(namespaces=[*caching.statistic_namespaces([old_tutor, tutor]),
+                                   *caching.tutor_namespaces([old_tutor, tutor])])
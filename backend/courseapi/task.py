@@ -1,26 +1,47 @@
+import logging
+
 from celery import shared_task
-from backend.settings import env
-from django.conf import settings
-import gspread
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from . import leaderboard
+from .gsheets import hw_col, mark_col, reconcile, writer
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task()
 def save_hw_to_gsheets(row, task, url):
-    if row is None:
-        return
-    client = gspread.service_account(filename=settings.GSHEET_CREDS)
-    print(env('SPREADSHEET'))
-    wsheet = client.open(env('SPREADSHEET')).get_worksheet(0)
-    col = int(env('FIRST_TASK_COL')) + (task - 1) * 2
-    wsheet.update_cell(row, col, url)
+    writer.write(row, hw_col(task), url)
 
 
 @shared_task()
 def save_mark_to_gsheets(row, task, mark):
-    if row is None:
-        return
-    client = gspread.service_account(filename=settings.GSHEET_CREDS)
-    print(env('SPREADSHEET'))
-    wsheet = client.open(env('SPREADSHEET')).get_worksheet(0)
-    col = int(env('FIRST_TASK_COL')) + (task - 1) * 2 + 1
-    wsheet.update_cell(row, col, mark)
+    writer.write(row, mark_col(task), mark)
+
+
+@shared_task()
+def save_marks_to_gsheets(marks):
+    '''marks - список (row, task, mark)'''
+    for row, task, mark in marks:
+        writer.write(row, mark_col(task), mark)
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_gsheets(**kwargs):
+    # буфер живёт в памяти процесса, поэтому перед выходом его надо дописать
+    writer.flush()
+
+
+@shared_task()
+def reconcile_gsheets():
+    report = reconcile()
+    if report['written']:
+        logger.warning(f"gsheets drift fixed: {report['urls']} urls, {report['marks']} marks")
+    return report['written']
+
+
+@shared_task()
+def rebuild_leaderboard():
+    # возвращает рейтингу флаг готовности, если его сняла неудачная запись
+    return leaderboard.rebuild()
@@ -1,3 +1,616 @@
-from django.test import TestCase
+import datetime
+import os
+import threading
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from gspread.utils import rowcol_to_a1
+from rest_framework.test import APIClient
+
+from backend.db_pool.pool import ConnectionPool, PoolTimeout
+
+from . import caching, gsheets, leaderboard
+from .fake_gspread import FakeWorksheet
+from .gsheets import SheetWriter, hw_col, mark_col
+from .models import Member, Task, Homework, Statistic
+from .serializers import (HomeworkListSerializer, HomeworkListValuesSerializer,
+                          StatisticSerializer, StatisticValuesSerializer,
+                          StudentPlainSerializer, StudentPlainValuesSerializer,
+                          TaskPlainSerializer, TaskPlainValuesSerializer)
+from .task import save_hw_to_gsheets, save_mark_to_gsheets, save_marks_to_gsheets
+
+
+@mock.patch('courseapi.views.leaderboard')
+@mock.patch('courseapi.views.save_mark_to_gsheets')
+class HomeworkCheckTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.tutor = Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        cls.student = Member.objects.create(username='student', tutor=cls.tutor, gsheets_id=5)
+        Statistic.objects.create(student=cls.student, tutor=cls.tutor)
+        cls.task, cls.project = Task.objects.bulk_create([
+            Task(start_date=today, end_date=today),
+            Task(start_date=today, end_date=today),
+        ])
+        Homework.objects.create(owner=cls.student, task=cls.task, url='https://figma.com/1')
+        Homework.objects.create(owner=cls.student, task=cls.project, url='https://figma.com/2')
+
+    def setUp(self):
+        # последовательности postgres не сбрасываются между тестами, поэтому id проекта заранее неизвестен
+        patcher = mock.patch.dict(os.environ, {'PROJECT_ID': str(self.project.id)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def check(self, task, mark, username='student'):
+        return self.client.put(f'/api/v1/{username}/checkhw', {'task': task.id, 'mark': mark}, format='json')
+
+    def test_query_budget(self, save_mark, leaderboard):
+        # savepoint, UPDATE дз, UPDATE статистики, release savepoint
+        with self.assertNumQueries(4):
+            response = self.check(self.task, 7.5)
+        self.assertEqual(response.status_code, 200)
+
+    def test_first_mark_and_recheck(self, save_mark, leaderboard):
+        self.check(self.task, 8)
+        statistic = Statistic.objects.get(student=self.student)
+        self.assertEqual((statistic.passed, statistic.sum, statistic.average), (1, 8, 8))
+
+        self.check(self.task, 6)
+        statistic.refresh_from_db()
+        self.assertEqual((statistic.passed, statistic.sum, statistic.average), (1, 6, 6))
+        self.assertEqual(Homework.objects.get(owner=self.student, task=self.task).mark, 6)
+
+    def test_zero_mark_counts_as_checked(self, save_mark, leaderboard):
+        self.check(self.task, 0)
+        self.check(self.task, 4)
+        statistic = Statistic.objects.get(student=self.student)
+        self.assertEqual((statistic.passed, statistic.sum), (1, 4))
+
+    def test_project_mark(self, save_mark, leaderboard):
+        self.check(self.task, 6)
+        self.check(self.project, 9)
+        statistic = Statistic.objects.get(student=self.student)
+        self.assertEqual((statistic.passed, statistic.average, statistic.project), (2, 7.5, 9))
+
+    def test_side_effects_after_commit(self, save_mark, leaderboard):
+        with mock.patch('courseapi.caching._invalidate') as invalidate_cache, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.check(self.task, 7)
+        save_mark.delay.assert_called_once_with(5, self.task.id, 7)
+        leaderboard.update.assert_called_once_with('student', 'tutor', 1, 7, None)
+        _, namespaces = invalidate_cache.call_args.args
+        self.assertTrue({'statistic:tutor', 'tutor:tutor', 'homeworks:student'} <= set(namespaces))
+
+    def test_mark_out_of_range(self, save_mark, leaderboard):
+        for mark in (-1, 10.5):
+            self.assertEqual(self.check(self.task, mark).status_code, 400)
+        self.assertIsNone(Homework.objects.get(owner=self.student, task=self.task).mark)
+
+    def test_unknown_homework(self, save_mark, leaderboard):
+        Homework.objects.filter(task=self.project).delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.check(self.project, 5)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Statistic.objects.get(student=self.student).passed, -1)
+
+
+@mock.patch('courseapi.views.leaderboard')
+@mock.patch('courseapi.views.save_marks_to_gsheets')
+class HomeworkBulkCheckTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.tutor = Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        cls.first = Member.objects.create(username='first', tutor=cls.tutor, gsheets_id=5)
+        cls.second = Member.objects.create(username='second', tutor=cls.tutor, gsheets_id=6)
+        Statistic.objects.create(student=cls.first, tutor=cls.tutor)
+        Statistic.objects.create(student=cls.second, tutor=cls.tutor)
+        cls.task, cls.project = Task.objects.bulk_create([
+            Task(start_date=today, end_date=today),
+            Task(start_date=today, end_date=today),
+        ])
+        for student in (cls.first, cls.second):
+            for task in (cls.task, cls.project):
+                Homework.objects.create(owner=student, task=task, url='https://figma.com/1')
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'PROJECT_ID': str(self.project.id)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def check(self, marks, tutor='tutor'):
+        return self.client.put(f'/api/v1/{tutor}/checkhw/bulk', {'marks': marks}, format='json')
+
+    def test_marks_applied_together(self, save_marks, leaderboard):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.check([
+                {'student': 'first', 'task': self.task.id, 'mark': 6},
+                {'student': 'first', 'task': self.project.id, 'mark': 9},
+                {'student': 'second', 'task': self.task.id, 'mark': 4},
+            ])
+        self.assertEqual(response.status_code, 200)
+        first = Statistic.objects.get(student=self.first)
+        self.assertEqual((first.passed, first.sum, first.average, first.project), (2, 15, 7.5, 9))
+        second = Statistic.objects.get(student=self.second)
+        self.assertEqual((second.passed, second.sum, second.project), (1, 4, None))
+        save_marks.delay.assert_called_once()
+        self.assertEqual(len(save_marks.delay.call_args.args[0]), 3)
+        leaderboard.update_many.assert_called_once()
+
+    def test_recheck_in_bulk(self, save_marks, leaderboard):
+        self.check([{'student': 'first', 'task': self.task.id, 'mark': 6}])
+        self.check([{'student': 'first', 'task': self.task.id, 'mark': 8}])
+        first = Statistic.objects.get(student=self.first)
+        self.assertEqual((first.passed, first.sum, first.average), (1, 8, 8))
+
+    def test_all_or_nothing(self, save_marks, leaderboard):
+        Homework.objects.filter(owner=self.second, task=self.project).delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.check([
+                {'student': 'first', 'task': self.task.id, 'mark': 6},
+                {'student': 'second', 'task': self.project.id, 'mark': 4},
+            ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing'], [{'student': 'second', 'task': self.project.id}])
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(Homework.objects.get(owner=self.first, task=self.task).mark)
+
+    def test_duplicates_rejected(self, save_marks, leaderboard):
+        response = self.check([
+            {'student': 'first', 'task': self.task.id, 'mark': 6},
+            {'student': 'first', 'task': self.task.id, 'mark': 7},
+        ])
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_tutor_students(self, save_marks, leaderboard):
+        Member.objects.create(username='other', role=Member.Role.TUTOR)
+        response = self.check([{'student': 'first', 'task': self.task.id, 'mark': 6}], tutor='other')
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch('courseapi.roster.leaderboard')
+class MemberImportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        Member.objects.create(username='taken')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def upload(self, body, content_type, query=''):
+        return self.client.generic('POST', f'/api/v1/members/import{query}', body.encode(), content_type)
+
+    def test_csv(self, leaderboard):
+        response = self.upload('username,role,tutor,gsheets_id\n'
+                               'new-tutor,2,,\n'
+                               'first,3,tutor,7\n'
+                               'second,,new-tutor,\n'
+                               'taken,3,tutor,\n'
+                               'third,3,nobody,\n', 'text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([(error['line'], error['username']) for error in response.data['errors']],
+                         [(5, 'taken'), (6, 'third')])
+        second = Member.objects.select_related('tutor', 'statistic').get(username='second')
+        self.assertEqual((second.role, second.tutor.username), (Member.Role.STUDENT, 'new-tutor'))
+        self.assertEqual(second.statistic.tutor_id, second.tutor_id)
+        self.assertEqual(Member.objects.get(username='first').gsheets_id, 7)
+        self.assertFalse(Statistic.objects.filter(student__username='new-tutor').exists())
+
+    def test_json_lines_in_chunks(self, leaderboard):
+        body = '\n'.join(f'{{"username": "student-{i}", "tutor": "tutor"}}' for i in range(5)) + '\n{broken\n'
+        with mock.patch('courseapi.roster.CHUNK_SIZE', 2), self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['errors'][0]['line'], 6)
+        self.assertEqual(Statistic.objects.filter(tutor__username='tutor').count(), 5)
+        self.assertEqual(leaderboard.update_many.call_count, 3)
+
+    def test_dry_run(self, leaderboard):
+        response = self.upload('{"username": "first"}\n{"username": "taken"}\n{"username": "first"}\n',
+                               'application/x-ndjson', '?dry_run=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 2))
+        self.assertFalse(Member.objects.filter(username='first').exists())
+
+    def test_unsupported_content_type(self, leaderboard):
+        response = self.upload('username\nfirst\n', 'text/plain')
+        self.assertEqual(response.status_code, 415)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@mock.patch('courseapi.signals.leaderboard')
+class TutorChangeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.old_tutor = Member.objects.create(username='old-tutor', role=Member.Role.TUTOR)
+        cls.new_tutor = Member.objects.create(username='new-tutor', role=Member.Role.TUTOR)
+        cls.student = Member.objects.create(username='student', tutor=cls.old_tutor)
+        Statistic.objects.create(student=cls.student, tutor=cls.old_tutor, passed=2, average=7.5)
+
+    def test_statistic_follows_tutor(self, leaderboard):
+        self.student.tutor = self.new_tutor
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.save()
+        self.assertEqual(Statistic.objects.get(student=self.student).tutor, self.new_tutor)
+        leaderboard.move.assert_called_once_with('student', 'old-tutor', 'new-tutor', 2, 7.5, None)
+
+    def test_other_changes_leave_statistic_alone(self, leaderboard):
+        self.student.chat_id = 42
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.save()
+        self.assertEqual(Statistic.objects.get(student=self.student).tutor, self.old_tutor)
+        leaderboard.move.assert_not_called()
+
+
+class SheetWriterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.worksheet = FakeWorksheet()
+        self.opened = 0
+        self.writer = SheetWriter(opener=self.open, window=60)
+
+    def open(self):
+        self.opened += 1
+        return self.worksheet
+
+    def test_last_write_per_cell_in_one_batch(self):
+        self.writer.write(2, 3, 'https://figma.com/1')
+        self.writer.write(2, 4, 5)
+        self.writer.write(2, 4, 7)
+        self.writer.write(None, 4, 9)
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(self.worksheet.calls, [('batch_update', [
+            {'range': 'C2', 'values': [['https://figma.com/1']]},
+            {'range': 'D2', 'values': [[7]]},
+        ])])
+
+        self.writer.write(3, 4, 6)
+        self.writer.flush()
+        self.assertEqual(self.opened, 1)
+        self.assertEqual(self.worksheet.cells[(3, 4)], 6)
+
+    def test_rate_limited_writes_are_kept(self):
+        self.worksheet.failures.append(429)
+        self.writer.write(2, 4, 5)
+        self.assertEqual(self.writer.flush(), 0)
+        self.writer.write(2, 4, 8)
+        self.assertEqual(self.writer.pending(), {(2, 4): 8})
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(self.worksheet.cells[(2, 4)], 8)
+
+    @mock.patch.dict(os.environ, {'FIRST_TASK_COL': '3'})
+    def test_tasks_share_the_buffer(self):
+        with mock.patch('courseapi.task.writer', self.writer):
+            save_hw_to_gsheets(5, 2, 'https://figma.com/2')
+            save_mark_to_gsheets(5, 2, 6)
+            save_marks_to_gsheets([(5, 2, 9), (6, 1, 4), (None, 1, 3)])
+        self.writer.flush()
+        self.assertEqual(len(self.worksheet.calls), 1)
+        self.assertEqual(self.worksheet.cells, {(5, 5): 'https://figma.com/2', (5, 6): 9, (6, 4): 4})
+
+
+class ReconcileTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.first, cls.second = Task.objects.bulk_create([
+            Task(start_date=today, end_date=today),
+            Task(start_date=today, end_date=today),
+        ])
+        student = Member.objects.create(username='student', gsheets_id=2)
+        other = Member.objects.create(username='other', gsheets_id=3)
+        Member.objects.create(username='no-row')
+        Homework.objects.create(owner=student, task=cls.first, url='https://figma.com/1', mark=7.5)
+        Homework.objects.create(owner=student, task=cls.second, url='https://figma.com/2')
+        Homework.objects.create(owner=other, task=cls.first, url='https://figma.com/3', mark=4)
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(os.environ, {'FIRST_TASK_COL': '3'}),
+                        mock.patch('courseapi.gsheets.writer',
+                                   SheetWriter(opener=lambda: self.worksheet, window=60))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # колонки зависят от id дз, а последовательности postgres между тестами не сбрасываются
+        first, second = self.first.id, self.second.id
+        self.worksheet = FakeWorksheet()
+        self.worksheet.cells = {
+            (2, hw_col(first)): 'https://figma.com/1', (2, mark_col(first)): '7,5',
+            (2, mark_col(second)): '9',
+            (3, hw_col(first)): 'https://figma.com/old',
+        }
+
+    def test_only_drifted_cells_written(self):
+        report = gsheets.reconcile()
+        self.assertEqual((report['homeworks'], report['urls'], report['marks'], report['sheet_only']), (3, 2, 1, 1))
+        self.assertEqual([call[0] for call in self.worksheet.calls], ['get_all_values', 'batch_update'])
+        expected = [rowcol_to_a1(2, hw_col(self.second.id)), rowcol_to_a1(3, hw_col(self.first.id)),
+                    rowcol_to_a1(3, mark_col(self.first.id))]
+        self.assertEqual(sorted(report['cells']), sorted(expected))
+        self.assertEqual(self.worksheet.cells[(3, hw_col(self.first.id))], 'https://figma.com/3')
+        self.assertEqual(self.worksheet.cells[(2, mark_col(self.second.id))], '9')
+
+    def test_dry_run(self):
+        report = gsheets.reconcile(dry_run=True)
+        self.assertEqual(report['written'], 0)
+        self.assertEqual([call[0] for call in self.worksheet.calls], ['get_all_values'])
+
+
+@mock.patch('courseapi.leaderboard.client')
+class LeaderboardTestCase(SimpleTestCase):
+    def test_failed_write_drops_ready_flag(self, client):
+        client.pipeline.return_value.execute.side_effect = leaderboard.redis.RedisError('down')
+        leaderboard.update('student', 'tutor', 1, 7, None)
+        leaderboard.remove('student', 'tutor')
+        self.assertEqual(client.delete.call_args_list, [mock.call(leaderboard.READY_KEY)] * 2)
+
+    def test_successful_write_keeps_ready_flag(self, client):
+        leaderboard.update('student', 'tutor', 1, 7, None)
+        client.delete.assert_not_called()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@mock.patch('courseapi.views.leaderboard')
+@mock.patch('courseapi.views.save_hw_to_gsheets')
+class ResponseCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.tutor = Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        cls.student = Member.objects.create(username='student', tutor=cls.tutor)
+        Statistic.objects.create(student=cls.student, tutor=cls.tutor)
+        cls.task, cls.next_task = Task.objects.bulk_create([
+            Task(start_date=today, end_date=today),
+            Task(start_date=today, end_date=today),
+        ])
+        Homework.objects.create(owner=cls.student, task=cls.task, url='https://figma.com/1')
+
+    def setUp(self):
+        caching.flush_stats()
+        cache.clear()
+        self.client = APIClient()
+
+    def test_whoami_cached_until_member_removed(self, save_hw, leaderboard):
+        self.client.get('/api/v1/student/whoami')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/student/whoami')
+        self.assertEqual(response.json(), {'role': Member.Role.STUDENT})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/v1/tutor/expel/student')
+        self.assertEqual(self.client.get('/api/v1/student/whoami').status_code, 404)
+
+    def test_late_fill_after_invalidation_not_served(self, save_hw, leaderboard):
+        def build():
+            # удаление участника закоммитилось между чтением из базы и записью в кеш
+            caching._invalidate(namespaces=['whoami:student'])
+            return {'role': Member.Role.STUDENT}
+
+        caching.fetch('whoami', ['student'], build, namespace='whoami:student')
+        self.assertIsNone(caching.fetch('whoami', ['student'], lambda: None, namespace='whoami:student'))
+
+    def test_grouped_invalidated_by_submit(self, save_hw, leaderboard):
+        self.assertEqual(len(self.client.get('/api/v1/tutor/groupedhwinfo').json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/v1/student/sendhw', {'task': self.next_task.id, 'url': 'https://figma.com/2'})
+        self.assertEqual(len(self.client.get('/api/v1/tutor/groupedhwinfo').json()), 2)
+
+    def test_timetable_invalidated_by_task_change(self, save_hw, leaderboard):
+        self.assertEqual(len(self.client.get('/api/v1/timetable').json()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(start_date=self.task.start_date, end_date=self.task.end_date)
+        self.assertEqual(len(self.client.get('/api/v1/timetable').json()), 3)
+
+    def test_homeworks_not_modified_until_submit(self, save_hw, leaderboard):
+        response = self.client.get('/api/v1/student/homeworks')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/student/homeworks', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/v1/student/sendhw', {'task': self.next_task.id, 'url': 'https://figma.com/2'})
+        response = self.client.get('/api/v1/student/homeworks', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_students_etag_depends_on_page(self, save_hw, leaderboard):
+        first = self.client.get('/api/v1/tutor/students')['ETag']
+        self.assertNotEqual(self.client.get('/api/v1/tutor/students?page_size=1')['ETag'], first)
+
+    def test_statistic_falls_back_to_database(self, save_hw, leaderboard):
+        with mock.patch('courseapi.async_views.leaderboard.top', return_value=None):
+            response = self.client.get('/api/v1/tutor/statistic/10')
+        self.assertEqual(response.json(), [{'username': 'student', 'passed': -1, 'average': 0.0, 'project': None}])
+
+    def test_timetable_not_modified(self, save_hw, leaderboard):
+        etag = self.client.get('/api/v1/timetable')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/timetable', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_hit_ratio(self, save_hw, leaderboard):
+        for _ in range(4):
+            self.client.get('/api/v1/student/whoami')
+        stats = self.client.get('/api/v1/cachestats').data
+        self.assertEqual(stats['whoami'], {'hits': 3, 'misses': 1, 'hit_ratio': 0.75})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class KeysetPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tutor = Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        students = Member.objects.bulk_create([Member(username=f'student-{i:02}', tutor=tutor) for i in range(7)])
+        # одинаковые результаты и NULL в project проверяют порядок на границах страниц
+        rows = [(3, 8.0, None), (3, 8.0, 9.0), (3, 8.0, None), (-1, 0, None),
+                (2, 9.5, None), (-1, 0, None), (3, 7.0, 6.0)]
+        Statistic.objects.bulk_create([
+            Statistic(student=student, tutor=tutor, passed=passed, average=average, project=project)
+            for student, (passed, average, project) in zip(students, rows)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url):
+        usernames, cursor, pages = [], '', 0
+        while cursor is not None:
+            response = self.client.get(url, {'cursor': cursor, 'page_size': 3})
+            self.assertLessEqual(len(response.data['results']), 3)
+            usernames += [row['username'] for row in response.data['results']]
+            cursor = response.data['next']
+            pages += 1
+        return usernames, pages
+
+    def test_students(self):
+        usernames, pages = self.walk('/api/v1/tutor/students')
+        self.assertEqual(usernames, [f'student-{i:02}' for i in range(7)])
+        self.assertEqual(pages, 3)
+
+    def test_statistic_matches_full_ordering(self):
+        expected = list(Statistic.objects.order_by('-passed', '-average', '-project', 'id')
+                                         .values_list('student__username', flat=True))
+        usernames, pages = self.walk('/api/v1/statistic/2')
+        self.assertEqual(usernames, expected)
+        self.assertEqual(pages, 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/tutor/students', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.info = mock.Mock(transaction_status=0)
+        self.rollbacks = 0
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = 0
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.checked = []
+        self.pool = ConnectionPool(max_size=2, timeout=0.05, check_after=60, check=self.checked.append)
+
+    def test_reuses_returned_connection(self):
+        connection = self.pool.checkout(FakeConnection)
+        self.pool.checkin(connection)
+        self.assertIs(self.pool.checkout(FakeConnection), connection)
+        stats = self.pool.stats()
+        self.assertEqual((stats['checkouts'], stats['connects'], stats['reused']), (2, 1, 1))
+        self.assertEqual(self.checked, [])
+
+    def test_open_transaction_rolled_back_on_checkin(self):
+        connection = self.pool.checkout(FakeConnection)
+        connection.info.transaction_status = 2
+        self.pool.checkin(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(self.pool.checkout(FakeConnection), connection)
+
+    def test_broken_connection_discarded(self):
+        connection = self.pool.checkout(FakeConnection)
+        connection.info.transaction_status = 4
+        self.pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(self.pool.checkout(FakeConnection), connection)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+
+    def test_idle_connection_checked_before_reuse(self):
+        connection = self.pool.checkout(FakeConnection)
+        self.pool.checkin(connection)
+        self.pool.check_after = 0
+        self.pool.checkout(FakeConnection)
+        self.assertEqual(self.checked, [connection])
+
+    def test_waits_then_times_out_when_exhausted(self):
+        self.pool.checkout(FakeConnection)
+        self.pool.checkout(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout(FakeConnection)
+        stats = self.pool.stats()
+        self.assertEqual((stats['in_use'], stats['timeouts']), (2, 1))
+
+    def test_waiter_gets_connection_returned_by_other_thread(self):
+        self.pool.timeout = 5
+        first = self.pool.checkout(FakeConnection)
+        self.pool.checkout(FakeConnection)
+        threading.Timer(0.05, self.pool.checkin, [first]).start()
+        self.assertIs(self.pool.checkout(FakeConnection), first)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+
+
+@mock.patch('courseapi.views.save_hw_to_gsheets')
+class InternalAPIStackTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.student = Member.objects.create(username='student')
+        cls.task = Task.objects.create(start_date=today, end_date=today)
+
+    def test_form_post_like_bot(self, save_hw):
+        response = self.client.post('/api/v1/student/sendhw',
+                                    urlencode({'task': self.task.id, 'url': 'https://figma.com/1'}),
+                                    content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['url'], 'https://figma.com/1')
+
+    def test_json_regardless_of_accept(self, save_hw):
+        response = self.client.get('/api/v1/test', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/v1/student/sendhw', '{"task": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+    def test_site_middleware_skipped(self, save_hw):
+        response = self.client.get('/api/v1/test')
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+
+class ValuesSerializerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        tutor = Member.objects.create(username='tutor', role=Member.Role.TUTOR)
+        students = Member.objects.bulk_create([Member(username=f'student-{i}', tutor=tutor) for i in range(3)])
+        tasks = Task.objects.bulk_create([Task(start_date=today, end_date=today) for _ in range(2)])
+        Statistic.objects.bulk_create([
+            Statistic(student=student, tutor=tutor, passed=i, average=7.5, project=None if i else 9.0)
+            for i, student in enumerate(students)
+        ])
+        Homework.objects.bulk_create([
+            Homework(owner=students[0], task=tasks[0], url='https://figma.com/1', mark=8.0),
+            Homework(owner=students[0], task=tasks[1], url='https://figma.com/2'),
+        ])
+
+    def assertSameData(self, model_serializer, values_serializer, queryset):
+        expected = model_serializer(queryset, many=True).data
+        self.assertEqual(values_serializer(values_serializer.values_list(queryset)).data,
+                         [dict(row) for row in expected])
+
+    def test_matches_model_serializers(self):
+        self.assertSameData(StudentPlainSerializer, StudentPlainValuesSerializer, Member.objects.order_by('id'))
+        self.assertSameData(HomeworkListSerializer, HomeworkListValuesSerializer, Homework.objects.order_by('id'))
+        self.assertSameData(TaskPlainSerializer, TaskPlainValuesSerializer, Task.objects.order_by('id'))
+        self.assertSameData(StatisticSerializer, StatisticValuesSerializer,
+                            Statistic.objects.annotate(username=F('student__username')).order_by('id'))
+
+    def test_extra_columns_not_in_response(self):
+        rows = StatisticValuesSerializer.values_list(Statistic.objects.order_by('id'), 'id')
+        self.assertEqual(StatisticValuesSerializer(rows).data[0],
+                         {'username': 'student-0', 'passed': 0, 'average': 7.5, 'project': 9.0})
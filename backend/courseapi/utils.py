@@ -1,19 +1,102 @@
 from .models import Statistic, Member, Homework
-from django.db.models import F
+from django.db import connection
 from backend.settings import env
 from django.conf import settings
 import gspread
 
 
-def updateStatisticCheck(username, task_id, prev_mark, mark):
-    statistic = Member.objects.get(username=username).statistic
-    prev_passed = max(statistic.passed, 0)
-    if not prev_mark:
-        statistic.passed = prev_passed + 1
-        statistic.sum = F('sum') + mark
-    else:
-        statistic.sum = F('sum') - prev_mark + mark
+CHECK_HOMEWORK_SQL = f'''
+    UPDATE {Homework._meta.db_table} AS hw SET mark = %s
+    FROM (
+        SELECT h.id, h.mark, m.gsheets_id, t.username AS tutor
+        FROM {Homework._meta.db_table} h
+        JOIN {Member._meta.db_table} m ON m.id = h.owner_id
+        LEFT JOIN {Member._meta.db_table} t ON t.id = m.tutor_id
+        WHERE m.username = %s AND h.task_id = %s
+        FOR UPDATE OF h
+    ) AS prev
+    WHERE hw.id = prev.id
+    RETURNING prev.mark, hw.owner_id, prev.gsheets_id, prev.tutor
+'''
 
-    if task_id == int(env('PROJECT_ID')):
-        statistic.project = mark
-    statistic.save()
+
+def checkHomework(username, task_id, mark):
+    '''
+    Ставит оценку одним UPDATE. Строка дз блокируется до конца транзакции, поэтому
+    предыдущая оценка не устареет, даже если два ментора проверяют одно дз одновременно.
+    Возвращает (prev_mark, owner_id, gsheets_id, tutor) или None, если такого дз нет.
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(CHECK_HOMEWORK_SQL, [mark, username, task_id])
+        return cursor.fetchone()
+
+
+UPDATE_STATISTIC_SQL = f'''
+    UPDATE {Statistic._meta.db_table} SET
+        passed = CASE WHEN %(first)s THEN GREATEST(passed, 0) + 1 ELSE passed END,
+        sum = sum + %(delta)s,
+        average = (sum + %(delta)s)
+            / GREATEST(CASE WHEN %(first)s THEN GREATEST(passed, 0) + 1 ELSE passed END, 1),
+        project = CASE WHEN %(is_project)s THEN %(mark)s ELSE project END
+    WHERE student_id = %(owner)s
+    RETURNING passed, average, project
+'''
+
+
+def updateStatisticCheck(owner_id, task_id, prev_mark, mark):
+    '''
+    Пересчитывает статистику студента одним UPDATE ... RETURNING.
+    Возвращает (passed, average, project) или None, если статистики нет.
+    '''
+    first = prev_mark is None
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_STATISTIC_SQL, {
+            'first': first,
+            'delta': mark if first else mark - prev_mark,
+            'is_project': task_id == int(env('PROJECT_ID')),
+            'mark': mark,
+            'owner': owner_id,
+        })
+        return cursor.fetchone()
+
+
+def applyMarksToStatistic(statistic, marks):
+    '''
+    Применяет к статистике сразу несколько оценок, marks - список (task_id, prev_mark, mark).
+    Статистика должна быть заблокирована select_for_update.
+    '''
+    project_id = int(env('PROJECT_ID'))
+    for task_id, prev_mark, mark in marks:
+        if prev_mark is None:
+            statistic.passed = max(statistic.passed, 0) + 1
+            statistic.sum += mark
+        else:
+            statistic.sum += mark - prev_mark
+        if task_id == project_id:
+            statistic.project = mark
+    statistic.average = statistic.sum / max(statistic.passed, 1)
+    return statistic
+
+
+UPSERT_HOMEWORK_SQL = f'''
+    WITH member AS (
+        SELECT m.id, m.gsheets_id, t.username AS tutor
+        FROM {Member._meta.db_table} m
+        LEFT JOIN {Member._meta.db_table} t ON t.id = m.tutor_id
+        WHERE m.username = %s
+    )
+    INSERT INTO {Homework._meta.db_table} (url, mark, owner_id, task_id)
+    SELECT %s, NULL, member.id, %s FROM member
+    ON CONFLICT (owner_id, task_id) DO UPDATE SET url = EXCLUDED.url
+    RETURNING task_id, url, (SELECT gsheets_id FROM member), (SELECT tutor FROM member)
+'''
+
+
+def upsertHomework(username, task_id, url):
+    '''
+    Сохраняет дз одним запросом INSERT ... ON CONFLICT по уникальному (owner, task).
+    Возвращает (task_id, url, gsheets_id, tutor) или None, если такого участника нет.
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_HOMEWORK_SQL, [username, url, task_id])
+        return cursor.fetchone()
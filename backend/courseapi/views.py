@@ -1,43 +1,68 @@
 from rest_framework.generics import get_object_or_404
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import UnsupportedMediaType
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .serializers import (MemberRoleSerializer,
-                          StudentPlainSerializer,
-                          HomeworkListSerializer,
-                          HomeworkSendSerializer,
+from .serializers import (MemberChatSerializer,
+                          StudentPlainValuesSerializer,
+                          HomeworkSubmitSerializer,
                           HomeworkCheckSerializer,
+                          HomeworkBulkCheckSerializer,
                           MemberSerializer,
                           TaskSerializer,
-                          TaskPlainSerializer,
-                          StatisticSerializer)
+                          TaskPlainValuesSerializer,
+                          StatisticValuesSerializer,
+                          StudentCardSerializer)
 from rest_framework import generics
-from django.db.models import Count, F
+from django.db.models import Prefetch, Q
 from django.db import transaction
-from django.db.utils import DatabaseError
+from django.db.utils import DatabaseError, IntegrityError
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 
 from .models import Member, Homework, Task, Statistic
-from .utils import updateStatisticCheck
-from .task import save_hw_to_gsheets, save_mark_to_gsheets
+from .pagination import StatisticPagination, StudentListPagination
+from .utils import applyMarksToStatistic, checkHomework, updateStatisticCheck, upsertHomework
+from . import caching, leaderboard, roster
+from backend.db_pool import pool as db_pool
+from .task import save_hw_to_gsheets, save_mark_to_gsheets, save_marks_to_gsheets
 import environ
+import logging
+import operator
 import os
+from collections import defaultdict
+from functools import reduce
 
 
 env = environ.Env()
 environ.Env.read_env()
 
+logger = logging.getLogger(__name__)
+
 
 class TestAPIView(APIView):
     def get(self, request):
         return Response(status=200)
 
 
-class StudentListPagination(PageNumberPagination):
-    page_size = 2
-    page_size_query_param = 'page_size'
-    max_page_size = 1000
+class ConditionalResponseMixin:
+    '''
+    Отвечает 304 на GET с актуальным If-None-Match. ETag строится из версий пространств имён
+    caching, которые увеличиваются при записи, поэтому ни запросов в базу, ни сериализации
+    тела для 304 не нужно.
+    '''
+
+    def get_etag_namespaces(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag = caching.etag(self.get_etag_namespaces(), request.get_full_path())
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
 
 
 class MemberCreateAPIView(generics.CreateAPIView):
@@ -49,151 +74,280 @@ class MemberCreateAPIView(generics.CreateAPIView):
             response = super().create(request, args, kwargs)
             if response.data['role'] == Member.Role.STUDENT:
                 try:
-                    Statistic(student_id=response.data['id']).save()
+                    statistic = Statistic(student_id=response.data['id'], tutor_id=response.data['tutor'])
+                    statistic.save()
                 except DatabaseError:
                     return Response({'message': 'ошибка создания статистики'}, status=400)
+                tutor = Member.objects.filter(pk=statistic.tutor_id).values_list('username', flat=True).first()
+                transaction.on_commit(lambda: leaderboard.update(response.data['username'], tutor, statistic.passed,
+                                                                 statistic.average, statistic.project))
+                caching.members_created([tutor])
         return response
 
 
+class MemberImportAPIView(APIView):
+    def post(self, request):
+        '''
+        Импорт участников из csv или json lines. Тело читается построчно, ?dry_run=1
+        только проверяет строки и ничего не пишет в базу.
+        '''
+        content_type = request.content_type.split(';')[0].strip()
+        reader = roster.READERS.get(content_type)
+        if reader is None:
+            raise UnsupportedMediaType(content_type)
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        lines = (line.decode('utf-8-sig') for line in (request.stream or ()))
+        result = roster.RosterImport(dry_run=dry_run).run(reader(lines))
+        return Response(result, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+
 class MemberDeleteAPIView(generics.DestroyAPIView):
-    queryset = Member
+    queryset = Member.objects.select_related('tutor')
     serializer_class = MemberSerializer
     lookup_field = 'username'
 
+    def perform_destroy(self, instance):
+        tutor = instance.tutor.username if instance.tutor else None
+        instance.delete()
+        leaderboard.remove(instance.username, tutor)
+        caching.member_removed(instance.username, tutor)
+
 
 class MemberExpelAPIView(APIView):
     def delete(self, request, username, student_username):
         student = get_object_or_404(Member, username=student_username, tutor__username=username)
         student.delete()
+        leaderboard.remove(student_username, username)
+        caching.member_removed(student_username, username)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class MemberRoleAPIView(generics.RetrieveAPIView):
-    queryset = Member.objects.all()
-    serializer_class = MemberRoleSerializer
-    lookup_field = 'username'
+class MemberChatAPIView(APIView):
+    def put(self, request, username):
+        serializer = MemberChatSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not Member.objects.filter(username=username).update(chat_id=serializer.validated_data['chat_id']):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(serializer.data)
 
 
-class MemberStudentsAPIView(generics.ListAPIView):
-    serializer_class = StudentPlainSerializer
+class RecipientsAPIView(APIView):
+    def get(self, request):
+        '''chat_id студентов для рассылки, с ?task=<id> - только тех, кто не сдал это дз'''
+        recipients = Member.objects.filter(role=Member.Role.STUDENT, chat_id__isnull=False)
+        task = request.query_params.get('task')
+        if task is not None:
+            if not task.isdigit():
+                return Response({'message': 'task должен быть числом'}, status=400)
+            recipients = recipients.exclude(hws__task_id=int(task))
+        return Response(list(recipients.order_by('id').values_list('chat_id', flat=True)))
 
-    def get_queryset(self):
-        return Member.objects.filter(tutor__username=self.kwargs['username']).all()
 
+class MemberStudentsAPIView(ConditionalResponseMixin, generics.ListAPIView):
+    serializer_class = StudentPlainValuesSerializer
+    pagination_class = StudentListPagination
 
-class MemberStudentsByTaskAPIView(generics.ListAPIView):
-    serializer_class = StudentPlainSerializer
+    def get_etag_namespaces(self):
+        return [f"tutor:{self.kwargs['username']}"]
 
     def get_queryset(self):
-        return Member.objects.filter(tutor__username=self.kwargs['username'],
-                                     hws__task_id=self.kwargs['task'],
-                                     hws__mark__isnull=True).all()
+        students = Member.objects.filter(tutor__username=self.kwargs['username'])
+        return self.serializer_class.values_list(students, *self.pagination_class.cursor_fields())
 
 
-class HomeworkAPIView(generics.ListAPIView):
-    serializer_class = HomeworkListSerializer
+class MemberStudentsByTaskAPIView(ConditionalResponseMixin, generics.ListAPIView):
+    serializer_class = StudentPlainValuesSerializer
+    pagination_class = StudentListPagination
+
+    def get_etag_namespaces(self):
+        return [f"tutor:{self.kwargs['username']}"]
 
     def get_queryset(self):
-        return Homework.objects.filter(owner__username=self.kwargs['username']).all().order_by('task')
+        students = Member.objects.filter(tutor__username=self.kwargs['username'],
+                                         hws__task_id=self.kwargs['task'],
+                                         hws__mark__isnull=True)
+        return self.serializer_class.values_list(students, *self.pagination_class.cursor_fields())
+
+
+class StudentCardAPIView(APIView):
+    def get(self, request, username, student_username):
+        '''всё, что нужно ментору для проверки дз студента, одним ответом'''
+        student = get_object_or_404(
+            Member.objects.select_related('statistic')
+                          .prefetch_related(Prefetch('hws', queryset=Homework.objects.order_by('task'))),
+            username=student_username,
+            tutor__username=username
+        )
+        return Response({
+            **StudentCardSerializer(student).data,
+            'tasks': TaskSerializer(Task.objects.order_by('id'), many=True).data,
+        })
 
 
 class HomeworkSendAPIView(APIView):
     def post(self, request, username):
-        member = get_object_or_404(Member, username=username)
-        instance = Homework.objects.filter(owner__username=username, task_id=request.data['task'])
-        if instance:
-            instance = instance[0]
-            serializer = HomeworkSendSerializer(data={
-                'owner': instance.owner_id,
-                'task': instance.task_id,
-                'url': request.data['url']
-            },
-                instance=instance)
-        else:
-            serializer = HomeworkSendSerializer(data={
-                'owner': member.pk,
-                'task': request.data['task'],
-                'url': request.data['url']
-            })
+        serializer = HomeworkSubmitSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            homework = upsertHomework(username, serializer.validated_data['task'], serializer.validated_data['url'])
+        except IntegrityError:
+            return Response({'message': 'такого дз нет'}, status=400)
+        if homework is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        task_id, url, gsheets_id, tutor = homework
+        caching.homework_submitted(username, tutor)
 
         try:
-            save_hw_to_gsheets.delay(member.gsheets_id, serializer.data['task'], serializer.data['url'])
+            save_hw_to_gsheets.delay(gsheets_id, task_id, url)
         except save_hw_to_gsheets.OperationalError as error:
-            print(error)
+            logger.error(error)
 
         return Response({
-            'task': serializer.data['task'],
-            'url': serializer.data['url'],
-            'username': member.username
+            'task': task_id,
+            'url': url,
+            'username': username
         })
 
 
 class HomeworkCheckAPIView(APIView):
     def put(self, request, username):
-        member = get_object_or_404(Member, username=username)
-        instance = get_object_or_404(Homework, owner__username=username, task_id=request.data['task'])
-        prev_mark = instance.mark
-        serializer = HomeworkCheckSerializer(data={
-            'mark': request.data['mark']
-        }, instance=instance)
+        serializer = HomeworkCheckSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        task_id = serializer.validated_data['task']
+        mark = serializer.validated_data['mark']
         with transaction.atomic():
-            serializer.save()
-            try:
-                updateStatisticCheck(username, instance.task_id, prev_mark, serializer.data['mark'])
-                try:
-                    save_mark_to_gsheets.delay(member.gsheets_id, instance.task_id, serializer.data['mark'])
-                except save_hw_to_gsheets.OperationalError as error:
-                    print(error)
-            except DatabaseError:
+            checked = checkHomework(username, task_id, mark)
+            if checked is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            prev_mark, owner_id, gsheets_id, tutor = checked
+            statistic = updateStatisticCheck(owner_id, task_id, prev_mark, mark)
+            if statistic is None:
+                transaction.set_rollback(True)
                 return Response({'message': 'ошибка обновления статистики'}, status=400)
+            transaction.on_commit(lambda: self.after_commit(username, tutor, gsheets_id, task_id, mark, statistic))
+            caching.homeworks_checked([username], [tutor])
 
         return Response({
-            'task': instance.task_id,
-            'mark': serializer.data['mark'],
-            'username': member.username
+            'task': task_id,
+            'mark': mark,
+            'username': username
         })
 
+    @staticmethod
+    def after_commit(username, tutor, gsheets_id, task_id, mark, statistic):
+        leaderboard.update(username, tutor, *statistic)
+        try:
+            save_mark_to_gsheets.delay(gsheets_id, task_id, mark)
+        except save_mark_to_gsheets.OperationalError as error:
+            logger.error(error)
 
-class HomeworkGroupedAPIView(APIView):
-    def get(self, request, username):
-        unchecked_homeworks = Homework.objects.filter(owner__tutor__username=username, mark__isnull=True)
-        grouped_info = unchecked_homeworks.values('task_id').annotate(kol=Count('task_id')).order_by('task_id')
-        return Response(grouped_info)
 
+class HomeworkBulkCheckAPIView(APIView):
+    def put(self, request, username):
+        '''
+        Оценки ментора пачкой: всё или ничего одной транзакцией, статистика каждого студента
+        пересчитывается один раз, в гугл таблицу уходит одна задача на все оценки.
+        '''
+        serializer = HomeworkBulkCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marks = {(mark['student'], mark['task']): mark['mark'] for mark in serializer.validated_data['marks']}
+        pairs = reduce(operator.or_, (Q(owner__username=student, task_id=task) for student, task in marks))
 
-class TaskAPIView(generics.ListAPIView):
-    serializer_class = TaskSerializer
+        with transaction.atomic():
+            homeworks = list(Homework.objects.select_for_update(of=('self',))
+                                     .select_related('owner')
+                                     .filter(pairs, owner__tutor__username=username)
+                                     .order_by('id'))
+            found = {(homework.owner.username, homework.task_id) for homework in homeworks}
+            missing = [{'student': student, 'task': task} for student, task in marks if (student, task) not in found]
+            if missing:
+                return Response({'message': 'таких дз нет', 'missing': missing}, status=400)
+
+            checked = defaultdict(list)
+            for homework in homeworks:
+                mark = marks[(homework.owner.username, homework.task_id)]
+                checked[homework.owner_id].append((homework.task_id, homework.mark, mark))
+                homework.mark = mark
+            statistics = list(Statistic.objects.select_for_update()
+                                       .filter(student_id__in=checked)
+                                       .order_by('id'))
+            if len(statistics) != len(checked):
+                transaction.set_rollback(True)
+                return Response({'message': 'ошибка обновления статистики'}, status=400)
+            for statistic in statistics:
+                applyMarksToStatistic(statistic, checked[statistic.student_id])
 
-    def get_queryset(self):
-        return Task.objects.all().order_by('id')
+            Homework.objects.bulk_update(homeworks, ['mark'])
+            Statistic.objects.bulk_update(statistics, ['passed', 'sum', 'average', 'project'])
+
+            owners = {homework.owner_id: homework.owner for homework in homeworks}
+            rows = [(owners[statistic.student_id].username, username,
+                     statistic.passed, statistic.average, statistic.project) for statistic in statistics]
+            sheet_marks = [(homework.owner.gsheets_id, homework.task_id, homework.mark) for homework in homeworks]
+            transaction.on_commit(lambda: self.after_commit(rows, sheet_marks))
+            caching.homeworks_checked([homework.owner.username for homework in homeworks], [username])
+
+        return Response({
+            'checked': [{'student': homework.owner.username, 'task': homework.task_id, 'mark': homework.mark}
+                        for homework in homeworks]
+        })
+
+    @staticmethod
+    def after_commit(rows, sheet_marks):
+        leaderboard.update_many(rows)
+        try:
+            save_marks_to_gsheets.delay(sheet_marks)
+        except save_marks_to_gsheets.OperationalError as error:
+            logger.error(error)
 
 
 class StatisticAPIView(generics.ListAPIView):
-    serializer_class = StatisticSerializer
+    '''весь рейтинг страницами по limit через ?cursor=, топ-limit отдаёт async_views.StatisticView'''
+    serializer_class = StatisticValuesSerializer
+    pagination_class = StatisticPagination
 
     def get_queryset(self):
         tutor = self.kwargs.get('username', None)
         if tutor:
-            statistics = Statistic.objects.filter(student__tutor__username=tutor)
+            statistics = Statistic.objects.filter(tutor__username=tutor)
         else:
             statistics = Statistic.objects
-        return (statistics.annotate(username=F('student__username'), average=F('sum') / F('passed'))
-                .order_by('-passed', '-average', '-project')
-                .all()[:self.kwargs['limit']])
+        # порядок совпадает с statistic_rank_idx / statistic_tutor_rank_idx, поэтому это top-N по индексу
+        return (self.serializer_class.values_list(statistics, *self.pagination_class.cursor_fields())
+                .order_by(*StatisticPagination.ordering))
 
 
 class TaskStartedAPIView(generics.ListAPIView):
-    serializer_class = TaskPlainSerializer
+    serializer_class = TaskPlainValuesSerializer
 
     def get_queryset(self):
-        return Task.objects.filter(start_date__lte=timezone.now())
+        return self.serializer_class.values_list(Task.objects.filter(start_date__lte=timezone.localdate()))
+
+    def list(self, request, *args, **kwargs):
+        # дата в ключе, т.к. список меняется и без записей, просто с наступлением нового дня по Москве
+        return Response(caching.fetch('tasks', ['started', timezone.localdate()],
+                                      lambda: list(self.get_serializer(self.get_queryset(), many=True).data),
+                                      namespace='tasks'))
 
 
 class TaskEndedAPIView(generics.ListAPIView):
-    serializer_class = TaskPlainSerializer
+    serializer_class = TaskPlainValuesSerializer
 
     def get_queryset(self):
-        return Task.objects.filter(end_date__lte=timezone.now())
+        return self.serializer_class.values_list(Task.objects.filter(end_date__lte=timezone.localdate()))
+
+    def list(self, request, *args, **kwargs):
+        return Response(caching.fetch('tasks', ['ended', timezone.localdate()],
+                                      lambda: list(self.get_serializer(self.get_queryset(), many=True).data),
+                                      namespace='tasks'))
+
+
+class CacheStatsAPIView(APIView):
+    def get(self, request):
+        return Response(caching.stats())
+
+
+class DatabasePoolStatsAPIView(APIView):
+    def get(self, request):
+        '''пул у каждого процесса свой, поэтому это счётчики только ответившего процесса'''
+        return Response(db_pool.stats())
@@ -0,0 +1,15 @@
+# Настройки gunicorn для продакшена: воркеры uvicorn поверх backend.asgi.
+# GUNICORN_WORKER_CLASS=sync запускает прежний WSGI режим, например для сравнения в loadtest.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+wsgi_app = 'backend.asgi:application' if 'uvicorn' in worker_class else 'backend.wsgi:application'
+# async воркер держит много соединений сразу, поэтому ему хватает процесса на ядро
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * (1 if 'uvicorn' in worker_class else 2)))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+graceful_timeout = 20
+reload = os.environ.get('GUNICORN_RELOAD', '').lower() in ('1', 'true')
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
@@ -0,0 +1,160 @@
+import time
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+from cachetools import LRUCache
+
+import settings
+from utils import slugify
+
+
+class BackendConnectionError(Exception):
+    '''бэкенд недоступен или не ответил за отведённое время'''
+
+
+class BackendHTTPError(Exception):
+    '''бэкенд ответил кодом ошибки'''
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+def _page_query(cursor: str = None, page_size: int = None) -> str:
+    query = {}
+    if cursor:
+        query['cursor'] = cursor
+    if page_size:
+        query['page_size'] = page_size
+    return f"?{urlencode(query)}" if query else ""
+
+
+class BackendClient:
+    '''общий для всего бота асинхронный клиент к /api/v1 с пулом keep-alive соединений'''
+
+    def __init__(self, base_url: str, timeout: float, pool_size: int):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        # path -> (etag, тело, когда проверяли) для GET с поддержкой If-None-Match
+        self._conditional = LRUCache(maxsize=settings.CONDITIONAL_CACHE_SIZE)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # сессия создаётся лениво, т.к. ей нужен запущенный event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _send(self, method: str, path: str, data: dict = None, headers: dict = None,
+                    timeout: float = None, json: Any = None) -> tuple:
+        '''выполняет запрос и возвращает (статус, заголовки, тело)'''
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        try:
+            async with self._get_session().request(method, self.base_url + path, data=data, json=json,
+                                                   headers=headers, timeout=request_timeout) as response:
+                if response.status >= 400:
+                    raise BackendHTTPError(response.status, await response.text())
+                payload = None
+                if response.content_type == 'application/json':
+                    payload = await response.json()
+                return response.status, response.headers, payload
+        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError, TimeoutError) as error:
+            raise BackendConnectionError(f"{method} {path}: {error!r}") from error
+
+    async def _request(self, method: str, path: str, data: dict = None, timeout: float = None,
+                       json: Any = None) -> Any:
+        _, _, payload = await self._send(method, path, data=data, timeout=timeout, json=json)
+        return payload
+
+    async def whoami(self, username: str) -> dict:
+        return await self._request('GET', f"/{slugify(username)}/whoami")
+
+    async def register_chat(self, username: str, chat_id: int) -> dict:
+        return await self._request('PUT', f"/{slugify(username)}/chat", data={'chat_id': chat_id})
+
+    async def recipients(self, task: int = None) -> list:
+        path = "/recipients" if task is None else f"/recipients?task={task}"
+        return await self._request('GET', path, timeout=max(self.timeout, 60))
+
+    async def _get_conditional(self, path: str, fresh_for: float = 0) -> Any:
+        '''
+        GET с ревалидацией: ответ с ETag хранится в памяти, первые fresh_for секунд отдаётся без
+        запроса, а потом перепроверяется через If-None-Match - на 304 бэкенд не шлёт тело.
+        Вызывающий код не должен менять возвращённый объект.
+        '''
+        cached = self._conditional.get(path)
+        if cached is not None and time.monotonic() - cached[2] < fresh_for:
+            return cached[1]
+
+        headers = {'If-None-Match': cached[0]} if cached is not None else None
+        status, response_headers, payload = await self._send('GET', path, headers=headers)
+        if status == 304 and cached is not None:
+            payload = cached[1]
+        etag = response_headers.get('ETag')
+        if etag:
+            self._conditional[path] = (etag, payload, time.monotonic())
+        else:
+            self._conditional.pop(path, None)
+        return payload
+
+    async def timetable(self) -> list:
+        '''расписание меняется редко, поэтому перепроверяется не чаще раза в TIMETABLE_TTL секунд'''
+        return await self._get_conditional("/timetable", fresh_for=settings.TIMETABLE_TTL)
+
+    async def started_tasks(self) -> list:
+        return await self._request('GET', "/tasks/started")
+
+    async def ended_tasks(self) -> list:
+        return await self._request('GET', "/tasks/ended")
+
+    async def send_homework(self, username: str, task: int, url: str) -> dict:
+        return await self._request('POST', f"/{slugify(username)}/sendhw", data={'url': url, 'task': task})
+
+    async def students(self, tutor: str, cursor: str = None, page_size: int = None) -> dict:
+        '''страница студентов ментора: {'results': [...], 'next': курсор следующей страницы или None}'''
+        return await self._get_conditional(f"/{slugify(tutor)}/students" + _page_query(cursor, page_size))
+
+    async def students_by_task(self, tutor: str, task: int, cursor: str = None, page_size: int = None) -> dict:
+        return await self._get_conditional(f"/{slugify(tutor)}/students/{task}" + _page_query(cursor, page_size))
+
+    async def homeworks(self, username: str) -> list:
+        return await self._get_conditional(f"/{slugify(username)}/homeworks")
+
+    async def student_card(self, tutor: str, student: str) -> dict:
+        return await self._request('GET', f"/{slugify(tutor)}/card/{slugify(student)}")
+
+    async def check_homework(self, username: str, task: int, mark: float) -> dict:
+        return await self._request('PUT', f"/{slugify(username)}/checkhw", data={'task': task, 'mark': mark})
+
+    async def check_homeworks(self, tutor: str, marks: list) -> dict:
+        '''marks - список {'student', 'task', 'mark'}, все оценки применяются одной транзакцией'''
+        marks = [{**mark, 'student': slugify(mark['student'])} for mark in marks]
+        return await self._request('PUT', f"/{slugify(tutor)}/checkhw/bulk", json={'marks': marks})
+
+    async def grouped_hw_info(self, tutor: str) -> list:
+        return await self._get_conditional(f"/{slugify(tutor)}/groupedhwinfo")
+
+    async def statistic(self, limit: int, tutor: str = None) -> list:
+        if tutor is None:
+            return await self._request('GET', f"/statistic/{limit}")
+        return await self._request('GET', f"/{slugify(tutor)}/statistic/{limit}")
+
+    async def delete_member(self, username: str):
+        return await self._request('DELETE', f"/delmember/{username}")
+
+    async def expel(self, tutor: str, student: str):
+        return await self._request('DELETE', f"/{slugify(tutor)}/expel/{student}")
+
+
+backend = BackendClient(settings.BACKEND_URL, settings.BACKEND_TIMEOUT, settings.BACKEND_POOL_SIZE)
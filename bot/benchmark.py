@@ -0,0 +1,354 @@
+'''
+Офлайн-бенчмарк обработчиков бота.
+
+Гоняет настоящий Dispatcher из bot.py (роутеры admin/student/tutor и aiogram_dialog) против
+поддельного Telegram API внутри процесса и локальной заглушки бэкенда на aiohttp. Хранилище FSM
+и кэш ролей - fakeredis из requirements.txt или локальный редис через --redis-url.
+
+    python benchmark.py --users 50 --rounds 5
+
+Печатает p50/p99 по каждому шагу сценариев /sendhw, /checkhw, /statistics и общее число апдейтов в секунду.
+'''
+import argparse
+import asyncio
+import itertools
+import os
+import statistics as stats
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import get_args
+
+BACKEND_PORT = int(os.environ.get("BENCH_BACKEND_PORT", 8765))
+
+# settings читается при импорте модулей бота, поэтому окружение готовим до импортов
+os.environ["BACKEND_URL"] = f"http://127.0.0.1:{BACKEND_PORT}/api/v1"
+os.environ["TOCKEN"] = "123456789:BENCHMARK-token"
+os.environ["TASKS"] = "5"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import GetMe, TelegramMethod  # noqa: E402
+from aiogram.types import (CallbackQuery, Chat, InlineKeyboardMarkup, Message,  # noqa: E402
+                           MessageEntity, Update, User)
+from aiohttp import web  # noqa: E402
+
+import role_cache  # noqa: E402
+from api import backend  # noqa: E402
+from bot import create_dispatcher  # noqa: E402
+from outbound import OutboundQueue  # noqa: E402
+
+TASKS = 5
+TUTORS = 10
+BOT_USER = User(id=1, is_bot=True, first_name="bench", username="bench_bot")
+
+
+class FakeTelegramSession(BaseSession):
+    '''поддельный Telegram API: запоминает последнее сообщение с клавиатурой в каждом чате'''
+
+    def __init__(self):
+        super().__init__()
+        self._message_ids = itertools.count(1)
+        self.last_messages = {}
+        self.calls = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None):
+        self.calls += 1
+        if isinstance(method, GetMe):
+            return BOT_USER
+
+        returning = method.__returning__
+        if returning is Message or Message in get_args(returning):
+            chat_id = method.chat_id
+            message = Message(
+                message_id=getattr(method, 'message_id', None) or next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type='private'),
+                from_user=BOT_USER,
+                text=getattr(method, 'text', None),
+                reply_markup=getattr(method, 'reply_markup', None),
+            ).as_(bot)
+            if isinstance(message.reply_markup, InlineKeyboardMarkup):
+                self.last_messages[chat_id] = message
+            return message
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class FakeBackend:
+    '''заглушка /api/v1 с данными в памяти'''
+
+    def __init__(self, students: int):
+        today = date.today()
+        self.tasks = [{
+            'id': i + 1,
+            'start_date': (today - timedelta(days=7 - i)).isoformat(),
+            'end_date': (today + timedelta(days=i)).isoformat(),
+        } for i in range(TASKS)]
+        self.roles = {f"tutor-{j}": 2 for j in range(TUTORS)}
+        self.tutor_of = {}
+        self.homeworks = defaultdict(dict)
+        for i in range(students):
+            username = f"student-{i}"
+            self.roles[username] = 3
+            self.tutor_of[username] = f"tutor-{i % TUTORS}"
+            for task in (1, 2):
+                self.homeworks[username][task] = {'task': task, 'url': f"https://www.figma.com/file/{task}",
+                                                  'mark': None}
+
+    def students_of(self, tutor):
+        return [username for username, tutor_ in self.tutor_of.items() if tutor_ == tutor]
+
+    def statistic(self, username):
+        marks = [hw['mark'] for hw in self.homeworks[username].values() if hw['mark'] is not None]
+        return {
+            'username': username,
+            'passed': len(marks) or -1,
+            'average': sum(marks) / len(marks) if marks else 0.0,
+            'project': None,
+        }
+
+    async def whoami(self, request):
+        role = self.roles.get(request.match_info['username'])
+        if role is None:
+            raise web.HTTPNotFound()
+        return web.json_response({'role': role})
+
+    async def chat(self, request):
+        data = await request.post()
+        return web.json_response({'chat_id': int(data['chat_id'])})
+
+    async def timetable(self, request):
+        if request.headers.get('If-None-Match') == '"bench"':
+            return web.Response(status=304, headers={'ETag': '"bench"'})
+        return web.json_response(self.tasks, headers={'ETag': '"bench"'})
+
+    async def send_hw(self, request):
+        data = await request.post()
+        username, task = request.match_info['username'], int(data['task'])
+        self.homeworks[username][task] = {'task': task, 'url': data['url'], 'mark': None}
+        return web.json_response({'task': task, 'url': data['url'], 'username': username})
+
+    async def grouped_hw_info(self, request):
+        kol = defaultdict(int)
+        for student in self.students_of(request.match_info['username']):
+            for hw in self.homeworks[student].values():
+                if hw['mark'] is None:
+                    kol[hw['task']] += 1
+        return web.json_response([{'task_id': task, 'kol': kol[task]} for task in sorted(kol)])
+
+    @staticmethod
+    def page(request, usernames):
+        '''та же форма ответа, что у KeysetPagination: курсором служит последний username страницы'''
+        cursor = request.query.get('cursor')
+        page_size = int(request.query.get('page_size', 16))
+        usernames = [username for username in sorted(usernames) if not cursor or username > cursor]
+        page = usernames[:page_size]
+        return web.json_response({
+            'next': page[-1] if len(usernames) > page_size else None,
+            'results': [{'username': username} for username in page],
+        })
+
+    async def students(self, request):
+        return self.page(request, self.students_of(request.match_info['username']))
+
+    async def students_by_task(self, request):
+        task = int(request.match_info['task'])
+        students = [username for username in self.students_of(request.match_info['username'])
+                    if task in self.homeworks[username] and self.homeworks[username][task]['mark'] is None]
+        return self.page(request, students)
+
+    async def card(self, request):
+        student = request.match_info['student']
+        if self.tutor_of.get(student) != request.match_info['username']:
+            raise web.HTTPNotFound()
+        statistic = self.statistic(student)
+        return web.json_response({
+            'username': student,
+            'homeworks': [self.homeworks[student][task] for task in sorted(self.homeworks[student])],
+            'statistic': {key: statistic[key] for key in ('passed', 'average', 'project')},
+            'tasks': self.tasks,
+        })
+
+    async def check_hw(self, request):
+        data = await request.post()
+        username, task = request.match_info['username'], int(data['task'])
+        homework = self.homeworks[username].get(task)
+        if homework is None:
+            raise web.HTTPNotFound()
+        homework['mark'] = float(data['mark'])
+        return web.json_response({'task': task, 'mark': homework['mark'], 'username': username})
+
+    async def check_hws(self, request):
+        marks = (await request.json())['marks']
+        tutor = request.match_info['username']
+        for mark in marks:
+            if self.tutor_of.get(mark['student']) != tutor or mark['task'] not in self.homeworks[mark['student']]:
+                raise web.HTTPBadRequest()
+        for mark in marks:
+            self.homeworks[mark['student']][mark['task']]['mark'] = float(mark['mark'])
+        return web.json_response({'checked': marks})
+
+    async def top(self, request):
+        tutor = request.match_info.get('username')
+        students = self.students_of(tutor) if tutor else list(self.tutor_of)
+        statistics = sorted((self.statistic(student) for student in students),
+                            key=lambda s: (s['passed'], s['average']), reverse=True)
+        return web.json_response(statistics[:int(request.match_info['limit'])])
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get('/api/v1/timetable', self.timetable),
+            web.get('/api/v1/statistic/{limit}', self.top),
+            web.get('/api/v1/{username}/whoami', self.whoami),
+            web.put('/api/v1/{username}/chat', self.chat),
+            web.post('/api/v1/{username}/sendhw', self.send_hw),
+            web.get('/api/v1/{username}/groupedhwinfo', self.grouped_hw_info),
+            web.get('/api/v1/{username}/students', self.students),
+            web.get('/api/v1/{username}/students/{task}', self.students_by_task),
+            web.get('/api/v1/{username}/card/{student}', self.card),
+            web.put('/api/v1/{username}/checkhw', self.check_hw),
+            web.put('/api/v1/{username}/checkhw/bulk', self.check_hws),
+            web.get('/api/v1/{username}/statistic/{limit}', self.top),
+        ])
+        return app
+
+
+class Driver:
+    '''собирает апдейты от имени пользователей и скармливает их диспетчеру, замеряя время'''
+
+    def __init__(self, bot: Bot, dispatcher, session: FakeTelegramSession):
+        self.bot = bot
+        self.dp = dispatcher
+        self.session = session
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+        self.latencies = defaultdict(list)
+
+    async def _feed(self, step: str, update: Update):
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies[step].append(time.perf_counter() - started)
+
+    async def send_text(self, step: str, user: User, text: str):
+        entities = []
+        if text.startswith('/'):
+            entities.append(MessageEntity(type='bot_command', offset=0, length=len(text.split()[0])))
+        elif text.startswith('https://'):
+            entities.append(MessageEntity(type='url', offset=0, length=len(text)))
+        message = Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=user.id, type='private'),
+            from_user=user,
+            text=text,
+            entities=entities or None,
+        )
+        await self._feed(step, Update(update_id=next(self._update_ids), message=message))
+
+    async def click(self, step: str, user: User, widget_id: str):
+        '''нажимает первую кнопку виджета widget_id в последнем сообщении диалога'''
+        message = self.session.last_messages[user.id]
+        for row in message.reply_markup.inline_keyboard:
+            for button in row:
+                if button.callback_data and f"{widget_id}:" in button.callback_data:
+                    callback = CallbackQuery(
+                        id=str(next(self._update_ids)),
+                        from_user=user,
+                        chat_instance=str(user.id),
+                        message=message,
+                        data=button.callback_data,
+                    )
+                    await self._feed(step, Update(update_id=next(self._update_ids), callback_query=callback))
+                    return
+        raise RuntimeError(f"{step}: нет кнопки {widget_id} у {user.username}")
+
+
+async def send_hw_flow(driver: Driver, user: User):
+    await driver.send_text("/sendhw", user, "/sendhw")
+    await driver.click("/sendhw: выбор дз", user, "hw_id")
+    await driver.send_text("/sendhw: ссылка", user, "https://www.figma.com/file/benchmark")
+
+
+async def check_hw_flow(driver: Driver, user: User):
+    await driver.send_text("/checkhw", user, "/checkhw")
+    await driver.click("/checkhw: выбор дз", user, "homeworks_to_check")
+    await driver.click("/checkhw: выбор студента", user, "students_by_hw")
+    await driver.send_text("/checkhw: оценка", user, "1 7.5")
+    await driver.send_text("/checkhw: несколько оценок", user, "1 8\n2 6.5")
+
+
+async def statistics_flow(driver: Driver, user: User):
+    await driver.send_text("/statistics", user, "/statistics 10")
+
+
+def telegram_user(user_id: int, username: str) -> User:
+    return User(id=user_id, is_bot=False, first_name=username, username=username.replace('-', '_'))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def run(args):
+    if args.redis_url:
+        from redis.asyncio import Redis
+        role_cache.redis = Redis.from_url(args.redis_url)
+    else:
+        try:
+            from fakeredis.aioredis import FakeRedis
+        except ImportError:
+            raise SystemExit("нужен fakeredis (pip install -r requirements.txt) или локальный редис через --redis-url")
+        role_cache.redis = FakeRedis()
+
+    # у каждого ментора должен быть хотя бы один студент с непроверенным дз
+    args.users = max(args.users, TUTORS)
+    fake_backend = FakeBackend(students=args.users)
+    runner = web.AppRunner(fake_backend.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', BACKEND_PORT).start()
+
+    session = FakeTelegramSession()
+    bot = Bot(token=os.environ["TOCKEN"], session=session)
+    if args.with_outbound:
+        # общая корзина в редисе - lua-скрипт, fakeredis без lupa его не выполнит
+        bot.session.middleware(OutboundQueue(role_cache.redis if args.redis_url else None))
+    driver = Driver(bot, create_dispatcher(), session)
+
+    students = [telegram_user(100_000 + i, f"student-{i}") for i in range(args.users)]
+    tutors = [telegram_user(10 + j, f"tutor-{j}") for j in range(TUTORS)]
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        await asyncio.gather(*(send_hw_flow(driver, user) for user in students))
+        await asyncio.gather(*(check_hw_flow(driver, user) for user in tutors))
+        await asyncio.gather(*(statistics_flow(driver, user) for user in tutors))
+    elapsed = time.perf_counter() - started
+
+    await backend.close()
+    await runner.cleanup()
+
+    updates = sum(len(latencies) for latencies in driver.latencies.values())
+    print(f"{'шаг':<28}{'n':>7}{'p50, мс':>10}{'p99, мс':>10}{'mean, мс':>10}")
+    for step, latencies in driver.latencies.items():
+        print(f"{step:<28}{len(latencies):>7}{percentile(latencies, 0.5) * 1000:>10.2f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.2f}{stats.mean(latencies) * 1000:>10.2f}")
+    print(f"\nапдейтов: {updates}, запросов к Telegram API: {session.calls}, "
+          f"время: {elapsed:.2f} с, {updates / elapsed:.1f} апдейтов/с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="офлайн-бенчмарк обработчиков бота")
+    parser.add_argument("--users", type=int, default=50, help="сколько студентов одновременно сдают дз")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--redis-url", default=None, help="локальный редис вместо fakeredis")
+    parser.add_argument("--with-outbound", action="store_true",
+                        help="пропускать исходящие запросы через лимиты телеграма")
+    asyncio.run(run(parser.parse_args()))
@@ -1,16 +1,23 @@
 import asyncio
 import logging
+import multiprocessing
 from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.enums import ParseMode
 from aiogram.filters.command import Command
 from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiogram_dialog import setup_dialogs
-from redis.asyncio.client import Redis
+from aiohttp import web
 
+import role_cache
 import settings
+from api import backend
+from broadcast import remind_about_deadlines, resume_broadcasts
+from outbound import outbound
 from routers import admin, student, tutor
+from scheduler import scheduler
 from shared import Role, format_symbols, get_role, get_timetable
 from utils import compare_date_str_to_now
 
@@ -114,7 +121,19 @@ async def get_curs_progress(message: types.Message):
     await message.answer("Расписание домашек🕔\n\n" + '\n'.join(timetable))
 
 
-async def main():
+async def on_startup(dispatcher: Dispatcher, bot: Bot):
+    dispatcher['role_invalidations'] = asyncio.create_task(role_cache.listen_invalidations())
+    dispatcher['reminders'] = asyncio.create_task(remind_about_deadlines(bot))
+    await resume_broadcasts(bot)
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    dispatcher['role_invalidations'].cancel()
+    dispatcher['reminders'].cancel()
+    await backend.close()
+
+
+def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(message)s",
@@ -122,13 +141,23 @@ async def main():
             logging.StreamHandler()
         ]
     )
+
+
+def create_bot() -> Bot:
     bot = Bot(token=settings.TOCKEN)
+    bot.session.middleware(outbound)
+    return bot
+
 
+def create_dispatcher() -> Dispatcher:
     storage = RedisStorage(
-        Redis.from_url(url=settings.REDIS_URL),
+        role_cache.redis,
         key_builder=DefaultKeyBuilder(with_destiny=True),
     )
     dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(scheduler)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     dp.message.register(register_chat, Command("start"))
     dp.message.register(get_help, Command("help"))
@@ -138,9 +167,62 @@ async def main():
 
     dp.include_routers(admin.router, student.router, tutor.router)
     setup_dialogs(dp)
+    return dp
+
 
+async def main():
+    setup_logging()
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
 
+async def set_webhook(bot: Bot, dispatcher: Dispatcher):
+    await bot.set_webhook(
+        url=settings.WEBHOOK_URL + settings.WEBHOOK_PATH,
+        secret_token=settings.WEBHOOK_SECRET or None,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+
+
+def run_webhook_worker(register_webhook: bool):
+    '''один процесс aiohttp-сервера, который скармливает апдейты телеграма тому же диспетчеру'''
+    setup_logging()
+    bot = create_bot()
+    dp = create_dispatcher()
+    if register_webhook:
+        dp.startup.register(set_webhook)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET or None,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    # несколько воркеров слушают один порт через SO_REUSEPORT
+    web.run_app(app, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT,
+                reuse_port=settings.WEBHOOK_WORKERS > 1, print=None)
+
+
+def run_webhook():
+    if settings.WEBHOOK_WORKERS == 1:
+        run_webhook_worker(register_webhook=True)
+        return
+
+    workers = [multiprocessing.Process(target=run_webhook_worker, args=(i == 0,))
+               for i in range(settings.WEBHOOK_WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if settings.BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from redis.exceptions import RedisError
+
+import settings
+from api import BackendConnectionError, BackendHTTPError, backend
+from outbound import bulk
+from role_cache import redis
+from shared import format_symbols
+from utils import current_date, tz
+
+ACTIVE_KEY = "broadcasts:active"
+
+# ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_tasks = set()
+# рассылки, которые сейчас идут в этом процессе
+_running = set()
+# значение лока рассылки, по нему процесс узнаёт свой лок, если не смог его снять
+_owner = uuid.uuid4().hex
+
+
+def _job_key(job_id: str):
+    return f"broadcast:{job_id}"
+
+
+def _recipients_key(job_id: str):
+    return f"broadcast:{job_id}:recipients"
+
+
+def _lock_key(job_id: str):
+    return f"broadcast:{job_id}:lock"
+
+
+def _done_key(job_id: str):
+    return f"broadcast:{job_id}:done"
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def start_broadcast(bot: Bot, text: str, task: int = None, notify_chat: int = None) -> tuple:
+    '''
+    Создаёт рассылку: получатели одним запросом берутся с бэкенда (все студенты или только
+    не сдавшие дз task) и сохраняются в редис, после чего рассылка идёт в фоне батчами.
+    Возвращает (id рассылки, число получателей).
+    '''
+    recipients = await backend.recipients(task)
+    job_id = uuid.uuid4().hex[:8]
+
+    pipe = redis.pipeline()
+    for i in range(0, len(recipients), settings.BROADCAST_BATCH):
+        pipe.rpush(_recipients_key(job_id), *recipients[i:i + settings.BROADCAST_BATCH])
+    pipe.hset(_job_key(job_id), mapping={
+        'text': text,
+        'total': len(recipients),
+        'sent': 0,
+        'failed': 0,
+        'cursor': 0,
+        'notify_chat': notify_chat or 0,
+        'created': datetime.now(tz).isoformat(timespec='minutes'),
+    })
+    pipe.sadd(ACTIVE_KEY, job_id)
+    await pipe.execute()
+
+    _spawn(run_broadcast(bot, job_id))
+    return job_id, len(recipients)
+
+
+async def _send(bot: Bot, chat_id: int, text: str) -> bool:
+    '''любая ошибка телеграма - неудачная отправка, сеть и 5xx перед этим повторяются с паузой'''
+    for attempt in range(settings.BROADCAST_SEND_RETRIES + 1):
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as error:
+            # бот заблокирован или чат удалён - повторять бессмысленно
+            logging.info(f"broadcast to {chat_id} failed: {error}")
+            return False
+        except TelegramRetryAfter as error:
+            # outbound уже исчерпал свои повторы
+            failure, delay = error, error.retry_after
+        except TelegramAPIError as error:
+            failure, delay = error, 2 ** attempt
+        if attempt < settings.BROADCAST_SEND_RETRIES:
+            await asyncio.sleep(delay)
+    logging.warning(f"broadcast to {chat_id} failed: {failure}")
+    return False
+
+
+async def _deliver(bot: Bot, job_id: str, index: int, chat_id: int, text: str):
+    sent = await _send(bot, chat_id, text)
+    # отметка сразу после отправки: продолжение рассылки не пошлёт это сообщение ещё раз
+    pipe = redis.pipeline()
+    pipe.sadd(_done_key(job_id), index)
+    pipe.hincrby(_job_key(job_id), 'sent' if sent else 'failed', 1)
+    await pipe.execute()
+
+
+async def _lock(job_id: str) -> bool:
+    if await redis.set(_lock_key(job_id), _owner, nx=True, ex=settings.BROADCAST_LOCK_TTL):
+        return True
+    # лок этого же процесса остаётся, если прошлая попытка упала вместе с редисом
+    return await redis.get(_lock_key(job_id)) == _owner.encode()
+
+
+async def run_broadcast(bot: Bot, job_id: str):
+    '''
+    Отправляет рассылку батчами. Каждое отправленное сообщение отмечается в редисе, а курсор
+    сдвигается после батча, поэтому продолжение рассылки не шлёт сообщения повторно. Лок не даёт
+    двум репликам слать одно и то же. Прерванная рассылка перезапускается через BROADCAST_RETRY_DELAY.
+    '''
+    if job_id in _running:
+        return
+    _running.add(job_id)
+    try:
+        if not await _lock(job_id):
+            return
+        try:
+            await _run(bot, job_id)
+        finally:
+            await redis.delete(_lock_key(job_id))
+    except Exception as error:
+        logging.error(f"broadcast {job_id} interrupted, retry in {settings.BROADCAST_RETRY_DELAY}s: {error}")
+        _spawn(_resume_later(bot, job_id))
+    finally:
+        _running.discard(job_id)
+
+
+async def _resume_later(bot: Bot, job_id: str):
+    await asyncio.sleep(settings.BROADCAST_RETRY_DELAY)
+    await run_broadcast(bot, job_id)
+
+
+async def _run(bot: Bot, job_id: str):
+    job = await redis.hgetall(_job_key(job_id))
+    if not job:
+        await redis.srem(ACTIVE_KEY, job_id)
+        return
+    text = job[b'text'].decode()
+    cursor = int(job[b'cursor'])
+
+    with bulk():
+        while True:
+            batch = await redis.lrange(_recipients_key(job_id), cursor, cursor + settings.BROADCAST_BATCH - 1)
+            if not batch:
+                break
+            done = {int(index) for index in await redis.smembers(_done_key(job_id))}
+            results = await asyncio.gather(*(_deliver(bot, job_id, index, int(chat_id), text)
+                                             for index, chat_id in enumerate(batch, cursor) if index not in done),
+                                           return_exceptions=True)
+            # ошибка поднимается только после того, как закончились все отправки батча
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            cursor += len(batch)
+
+            pipe = redis.pipeline()
+            pipe.hset(_job_key(job_id), 'cursor', cursor)
+            pipe.delete(_done_key(job_id))
+            pipe.expire(_lock_key(job_id), settings.BROADCAST_LOCK_TTL)
+            await pipe.execute()
+
+    await _finish(bot, job_id)
+
+
+async def _finish(bot: Bot, job_id: str):
+    job = await redis.hgetall(_job_key(job_id))
+    pipe = redis.pipeline()
+    pipe.srem(ACTIVE_KEY, job_id)
+    pipe.delete(_recipients_key(job_id))
+    pipe.delete(_done_key(job_id))
+    pipe.expire(_job_key(job_id), settings.BROADCAST_KEEP)
+    await pipe.execute()
+
+    notify_chat = int(job[b'notify_chat'])
+    if notify_chat:
+        try:
+            await bot.send_message(chat_id=notify_chat,
+                                   text=f"Рассылка {job_id} завершена: доставлено {int(job[b'sent'])} "
+                                        f"из {int(job[b'total'])}, ошибок {int(job[b'failed'])}.")
+        except TelegramAPIError as error:
+            logging.error(f"broadcast {job_id} finished, notification failed: {error}")
+
+
+async def resume_broadcasts(bot: Bot):
+    '''подхватывает рассылки, которые не успели закончиться до перезапуска бота'''
+    try:
+        job_ids = await redis.smembers(ACTIVE_KEY)
+    except RedisError as error:
+        logging.error(error)
+        return
+    for job_id in job_ids:
+        _spawn(run_broadcast(bot, job_id.decode()))
+
+
+async def broadcasts_progress() -> list:
+    job_ids = sorted(job_id.decode() for job_id in await redis.smembers(ACTIVE_KEY))
+    progress = []
+    for job_id in job_ids:
+        job = await redis.hgetall(_job_key(job_id))
+        if job:
+            progress.append({
+                'id': job_id,
+                'created': job[b'created'].decode(),
+                'total': int(job[b'total']),
+                'sent': int(job[b'sent']),
+                'failed': int(job[b'failed']),
+                'cursor': int(job[b'cursor']),
+            })
+    return progress
+
+
+async def remind_about_deadlines(bot: Bot):
+    '''
+    Раз в REMINDER_CHECK_INTERVAL проверяет, не закрывается ли сегодня какое-то дз, и после
+    REMINDER_HOUR по Москве рассылает напоминание тем, кто его ещё не сдал. Ключ в редисе
+    гарантирует одно напоминание на дз, сколько бы реплик бота ни было запущено, и снимается,
+    если рассылку создать не удалось, чтобы следующая проверка попробовала снова.
+    '''
+    while True:
+        try:
+            if datetime.now(tz).hour >= settings.REMINDER_HOUR:
+                today = current_date().isoformat()
+                for task in await backend.timetable():
+                    if task['end_date'] != today:
+                        continue
+                    text = (f"⏰ Сегодня последний день сдачи дз {format_symbols.get(task['id'], task['id'])}!\n\n"
+                            "Не забудь отправить его через /sendhw")
+                    key = f"reminder:{task['id']}:{today}"
+                    if not await redis.set(key, 1, nx=True, ex=2 * 24 * 60 * 60):
+                        continue
+                    try:
+                        job_id, total = await start_broadcast(bot, text, task=task['id'])
+                    except Exception:
+                        await redis.delete(key)
+                        raise
+                    logging.info(f"reminder {job_id} for task {task['id']}: {total} recipients")
+        except (BackendConnectionError, BackendHTTPError, RedisError) as error:
+            logging.error(error)
+        except Exception:
+            # цикл не должен умирать из-за одной ошибки, иначе напоминаний не будет до перезапуска
+            logging.exception("deadline reminder failed")
+        await asyncio.sleep(settings.REMINDER_CHECK_INTERVAL)
@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from cachetools import TTLCache
+from redis.asyncio import Redis
+
+import settings
+from role_cache import redis
+
+INTERACTIVE = 0
+BULK = 1
+
+# лимит на чат телеграм считает по новым сообщениям: правки и ответы на кнопки в диалогах его не тратят
+MESSAGE_METHODS = ('send', 'copy', 'forward')
+
+# массовые рассылки помечают свои запросы, чтобы ответы пользователям шли вне очереди
+bulk_sending: ContextVar[bool] = ContextVar('bulk_sending', default=False)
+
+
+@contextmanager
+def bulk():
+    token = bulk_sending.set(True)
+    try:
+        yield
+    finally:
+        bulk_sending.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_consume(self) -> float:
+        '''забирает токен и возвращает 0, а если токенов нет - сколько секунд ждать следующего'''
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while delay := self.try_consume():
+            await asyncio.sleep(delay)
+
+
+class RedisTokenBucket:
+    '''
+    Та же корзина, но в редисе, общая для всех процессов и реплик бота. Массовым запросам
+    токен достаётся, только если в корзине остаётся больше reserve, поэтому интерактивные
+    ответы обгоняют рассылку и из соседнего процесса.
+    '''
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, redis: Redis, key: str, rate: float, capacity: float, reserve: float) -> None:
+        self._script = redis.register_script(self.SCRIPT)
+        self._key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+
+    async def try_consume(self, priority: int) -> float:
+        reserve = self.reserve if priority == BULK else 0
+        # lua отдаёт числа целыми, поэтому ожидание приходит строкой
+        return float(await self._script(keys=[self._key], args=[self.rate, self.capacity, reserve]))
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    '''
+    Очередь исходящих запросов к телеграму: общий лимит на бота и лимит на новые сообщения в чат,
+    интерактивные ответы обгоняют массовые рассылки, RetryAfter переотправляется автоматически.
+    Общий лимит считается в редисе на все процессы и реплики; если редис недоступен,
+    процесс берёт свою долю TG_GLOBAL_RATE / WEBHOOK_WORKERS из локальной корзины.
+    '''
+
+    def __init__(self, redis: Redis = None) -> None:
+        self._shared = None
+        if redis is not None:
+            self._shared = RedisTokenBucket(redis, 'tg:bucket:global', settings.TG_GLOBAL_RATE,
+                                            settings.TG_GLOBAL_RATE, settings.TG_BULK_RESERVE)
+        local_rate = settings.TG_GLOBAL_RATE / max(settings.WEBHOOK_WORKERS, 1)
+        self._global = TokenBucket(local_rate, local_rate)
+        # корзина простаивающего чата всё равно полная, так что её можно забыть
+        self._chats = TTLCache(maxsize=settings.TG_CHAT_BUCKETS, ttl=60)
+        self._waiters = []
+        self._seq = itertools.count()
+        self._pump_task = None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(settings.TG_CHAT_RATE, settings.TG_CHAT_BURST)
+            else:
+                bucket = TokenBucket(settings.TG_GROUP_RATE, settings.TG_CHAT_BURST)
+        # перезапись продлевает ttl активного чата
+        self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority: int, new_message: bool):
+        if new_message:
+            await self._chat_bucket(chat_id).acquire()
+        await self._acquire_global(priority)
+
+    async def _acquire_global(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        '''раздаёт токены общей корзины ожидающим в порядке приоритета'''
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = await self._consume_global(self._waiters[0][0])
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+    async def _consume_global(self, priority: int) -> float:
+        if self._shared is not None:
+            # любая ошибка здесь остановила бы _pump, и все ожидающие повисли бы до следующего запроса
+            try:
+                return await self._shared.try_consume(priority)
+            except Exception as error:
+                logging.error(f"shared rate limit unavailable: {error!r}")
+        return self._global.try_consume()
+
+    def stats(self) -> dict:
+        return {
+            'interactive_waiting': sum(1 for waiter in self._waiters if waiter[0] == INTERACTIVE),
+            'bulk_waiting': sum(1 for waiter in self._waiters if waiter[0] == BULK),
+        }
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = BULK if bulk_sending.get() else INTERACTIVE
+        api_method = method.__api_method__
+        new_message = api_method.startswith(MESSAGE_METHODS) and api_method != 'sendChatAction'
+        # TG_SEND_RETRIES - число попыток, последняя выполняется всегда, даже при 0 в настройках
+        for _ in range(settings.TG_SEND_RETRIES - 1):
+            await self._acquire(chat_id, priority, new_message)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as error:
+                logging.warning(f"flood wait {error.retry_after}s for chat {chat_id}")
+                await asyncio.sleep(error.retry_after)
+        await self._acquire(chat_id, priority, new_message)
+        return await make_request(bot, method)
+
+
+outbound = OutboundQueue(redis if settings.TG_SHARED_RATE_LIMIT else None)
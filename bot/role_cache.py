@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+import settings
+
+# роль-заглушка для тех, кого бэкенд не знает (404 на /whoami)
+NOT_MEMBER = 0
+
+# единый на весь бот пул соединений с редисом: кэш ролей, FSM, локи чатов, рассылки и pub/sub.
+# Апдейтов одновременно бывает больше, чем соединений, поэтому при занятом пуле запрос ждёт
+# свободное соединение, а не падает с "Too many connections"
+redis = Redis.from_pool(BlockingConnectionPool.from_url(
+    settings.REDIS_URL, max_connections=settings.REDIS_POOL_SIZE, timeout=settings.REDIS_POOL_TIMEOUT))
+
+# локальный уровень кэша перед редисом, сбрасывается по pub/sub из любой реплики бота
+local_roles = TTLCache(maxsize=settings.ROLE_LOCAL_CACHE_SIZE, ttl=settings.ROLE_LOCAL_CACHE_TTL)
+
+
+def role_key(username: str):
+    return f"role:{username}"
+
+
+async def get_cached_role(username: str) -> Optional[int]:
+    '''возвращает роль из кэша, NOT_MEMBER для закэшированного 404 или None, если ничего нет'''
+    role = local_roles.get(username)
+    if role is not None:
+        return role
+
+    try:
+        role = await redis.get(role_key(username))
+    except RedisError as error:
+        logging.error(error)
+        return None
+    if role is None:
+        return None
+    role = int(role)
+    local_roles[username] = role
+    return role
+
+
+async def cache_role(username: str, role: int):
+    local_roles[username] = role
+    try:
+        await redis.set(role_key(username), role, ex=settings.ROLE_CACHE_TTL)
+    except RedisError as error:
+        logging.error(error)
+
+
+async def cache_not_member(username: str):
+    local_roles[username] = NOT_MEMBER
+    try:
+        await redis.set(role_key(username), NOT_MEMBER, ex=settings.ROLE_NEGATIVE_TTL)
+    except RedisError as error:
+        logging.error(error)
+
+
+async def forget_role(username: str):
+    '''удаляет роль из обоих уровней кэша и рассылает инвалидацию остальным репликам'''
+    local_roles.pop(username, None)
+    try:
+        await redis.delete(role_key(username))
+        await redis.publish(settings.ROLE_INVALIDATION_CHANNEL, username)
+    except RedisError as error:
+        logging.error(error)
+
+
+async def listen_invalidations():
+    '''слушает канал инвалидаций и выкидывает пользователей из локального кэша'''
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(settings.ROLE_INVALIDATION_CHANNEL)
+                # пока подписки не было, инвалидации могли потеряться
+                local_roles.clear()
+                async for message in pubsub.listen():
+                    local_roles.pop(message['data'].decode(), None)
+        except RedisError as error:
+            logging.error(error)
+            local_roles.clear()
+            await asyncio.sleep(1)
@@ -1,15 +1,15 @@
-import asyncio
 import logging
 
-import requests
-from aiogram import Router, types
+from aiogram import Bot, Router, types
 from aiogram.enums import ParseMode
 from aiogram.filters.command import Command, CommandObject
-from requests import HTTPError
-from requests.exceptions import ConnectionError
 
 import settings
-from shared import AccessMiddleware, Role
+from api import BackendConnectionError, BackendHTTPError, backend
+from broadcast import broadcasts_progress, start_broadcast
+from outbound import outbound
+from scheduler import scheduler
+from shared import AccessMiddleware, Role, format_symbols
 from utils import del_from_redis, stringify
 
 router = Router()
@@ -37,18 +37,16 @@ async def get_top_students(message: types.Message, command: CommandObject):
             return
 
     try:
-        response = requests.get(settings.BACKEND_URL + f"/statistic/{limit}")
-        response.raise_for_status()
-    except ConnectionError as error:
+        statistics = await backend.statistic(limit)
+    except BackendConnectionError as error:
         logging.error(error)
         await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
         return
-    except HTTPError as error:
+    except BackendHTTPError as error:
         logging.error(error)
         await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
         return
 
-    statistics = response.json()
     students_statistics = []
     num = 1
     for statistic in statistics:
@@ -79,19 +77,96 @@ async def delete_student(message: types.Message, command: CommandObject):
     username = command.args.split(" ")[0]
 
     try:
-        response = requests.delete(settings.BACKEND_URL + f"/delmember/{stringify(username)}")
-        response.raise_for_status()
-    except ConnectionError as error:
+        await backend.delete_member(stringify(username))
+    except BackendConnectionError as error:
         logging.error(error)
         await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
         return
-    except HTTPError as error:
-        if error.response.status_code == 404:
+    except BackendHTTPError as error:
+        if error.status == 404:
             await message.answer(f"Не вижу такого участника🤨")
         else:
             logging.error(error)
             await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
         return
 
-    del_from_redis(username)
+    await del_from_redis(username)
     await message.answer(f"Участник <b>@{username}</b> успешно исключён.", parse_mode=ParseMode.HTML)
+
+
+@router.message(Command("stats"))
+async def get_bot_stats(message: types.Message):
+    '''счётчики очередей апдейтов и исходящих сообщений текущего процесса бота'''
+    stats = scheduler.stats()
+    sending = outbound.stats()
+    await message.answer(f"В очереди: <b>{stats['queued']}</b>\n"
+                         f"В обработке: <b>{stats['running']}</b>\n"
+                         f"Обработано: <b>{stats['processed']}</b>\n"
+                         f"Активных чатов: <b>{stats['chats']}</b>\n"
+                         f"Среднее ожидание: <b>{stats['avg_wait'] * 1000:.1f} мс</b>\n"
+                         f"Макс. ожидание: <b>{stats['max_wait'] * 1000:.1f} мс</b>\n\n"
+                         f"Ответов ждут отправки: <b>{sending['interactive_waiting']}</b>\n"
+                         f"Сообщений рассылок ждут отправки: <b>{sending['bulk_waiting']}</b>",
+                         parse_mode=ParseMode.HTML)
+
+
+@router.message(Command("broadcast"))
+async def broadcast_to_students(message: types.Message, command: CommandObject, bot: Bot):
+    '''рассылка сообщения всем студентам курса'''
+    if command.args is None:
+        await message.answer("/broadcast <i>&lt;текст&gt;</i>", parse_mode=ParseMode.HTML)
+        return
+
+    try:
+        job_id, total = await start_broadcast(bot, command.args, notify_chat=message.chat.id)
+    except BackendConnectionError as error:
+        logging.error(error)
+        await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
+        return
+    except BackendHTTPError as error:
+        logging.error(error)
+        await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
+        return
+
+    await message.answer(f"Рассылка <b>{job_id}</b> запущена, получателей: <b>{total}</b>.\n\n"
+                         "/broadcasts - прогресс рассылок", parse_mode=ParseMode.HTML)
+
+
+@router.message(Command("remind"))
+async def remind_about_homework(message: types.Message, command: CommandObject, bot: Bot):
+    '''напоминание о дз всем, кто его ещё не сдал'''
+    try:
+        task = int(command.args.split(" ")[0])
+        if task not in format_symbols:
+            raise ValueError
+    except (AttributeError, ValueError):
+        await message.answer("/remind <i>&lt;номер дз&gt;</i>", parse_mode=ParseMode.HTML)
+        return
+
+    text = (f"⏰ Напоминаем про дз {format_symbols[task]}!\n\n"
+            "Не забудь отправить его через /sendhw")
+    try:
+        job_id, total = await start_broadcast(bot, text, task=task, notify_chat=message.chat.id)
+    except BackendConnectionError as error:
+        logging.error(error)
+        await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
+        return
+    except BackendHTTPError as error:
+        logging.error(error)
+        await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
+        return
+
+    await message.answer(f"Напоминание <b>{job_id}</b> запущено, не сдали дз: <b>{total}</b>.",
+                         parse_mode=ParseMode.HTML)
+
+
+@router.message(Command("broadcasts"))
+async def get_broadcasts_progress(message: types.Message):
+    progress = await broadcasts_progress()
+    if not progress:
+        await message.answer("Активных рассылок нет.")
+        return
+
+    lines = [f"<b>{job['id']}</b> ({job['created']}): отправлено {job['cursor']}/{job['total']}, "
+             f"ошибок {job['failed']}" for job in progress]
+    await message.answer("📨 Активные рассылки\n\n" + '\n'.join(lines), parse_mode=ParseMode.HTML)
@@ -1,7 +1,6 @@
 import logging
 from typing import Any
 
-import requests
 from aiogram import Bot, Router, types
 from aiogram.dispatcher.middlewares.user_context import EventContext
 from aiogram.enums import ParseMode
@@ -12,10 +11,9 @@ from aiogram_dialog import Dialog, DialogManager, StartMode, Window
 from aiogram_dialog.widgets.input import MessageInput
 from aiogram_dialog.widgets.kbd import Back, Button, Cancel, Row, Select
 from aiogram_dialog.widgets.text import Const, Format
-from requests import HTTPError
-from requests.exceptions import ConnectionError
 
 import settings
+from api import BackendConnectionError, BackendHTTPError, backend
 from shared import AccessMiddleware, Role
 from utils import compare_date_str_to_now, del_from_redis, slugify
 
@@ -31,22 +29,20 @@ class SendHwSG(StatesGroup):
 async def hw_list_getter(bot: Bot, event_context: EventContext, dialog_manager: DialogManager, **kwargs):
     '''возвращает кол-во доступных дз для сдачи'''
     try:
-        response = requests.get(settings.BACKEND_URL + "/timetable")
-        response.raise_for_status()
-    except ConnectionError as error:
+        tasks = await backend.timetable()
+    except BackendConnectionError as error:
         logging.error(error)
         await bot.send_message(chat_id=event_context.chat_id, text="Сервер временно недоступен 😔\n"
                                                                    "Над этим уже работают!\n\nПопробуй ещё раз позже.")
         await dialog_manager.done()
         return
-    except HTTPError as error:
+    except BackendHTTPError as error:
         logging.error(error)
         await bot.send_message(chat_id=event_context.chat_id, text=f"Упс, что-то пошло не так😳. "
                                                                    "Попробуй ещё раз позже.")
         await dialog_manager.done()
         return
 
-    tasks = response.json()
     opened_homeworks = []
     for task in tasks:
         if compare_date_str_to_now(task['start_date']) <= 0 <= compare_date_str_to_now(task['end_date']):
@@ -87,18 +83,15 @@ async def hw_handler(message: Message, message_input: MessageInput, dialog_manag
                                   "Отправь, пожалуйста, ещё раз.")
     else:
         try:
-            response = requests.post(settings.BACKEND_URL + f"/{slugify(message.from_user.username)}/sendhw",
-                                     data={
-                                        'url': hw_link,
-                                        'task': int(dialog_manager.dialog_data['task_id'])
-                                     })
-            response.raise_for_status()
-        except ConnectionError as error:
+            await backend.send_homework(message.from_user.username,
+                                        task=int(dialog_manager.dialog_data['task_id']),
+                                        url=hw_link)
+        except BackendConnectionError as error:
             logging.error(error)
             await message.answer("Сервер временно недоступен 😔\nНад этим уже работают!\n\nПопробуй ещё раз позже.")
             await dialog_manager.done()
             return
-        except HTTPError as error:
+        except BackendHTTPError as error:
             logging.error(error)
             await message.answer(f"Упс, что-то пошло не так😳. Напиши, пожалуйста {settings.ADMIN}.")
             await dialog_manager.done()
@@ -154,20 +147,19 @@ class LeaveStates(StatesGroup):
 async def confirm_leave(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
     username = callback.from_user.username
     try:
-        response = requests.delete(settings.BACKEND_URL + f"/delmember/{slugify(username)}")
-        response.raise_for_status()
-    except ConnectionError as error:
+        await backend.delete_member(slugify(username))
+    except BackendConnectionError as error:
         logging.error(error)
         await callback.message.answer(f"Сервер временно недоступен 😔\n\n"
                                       f"Над этим уже работают!\n\nПопробуй ещё раз позже.")
         await dialog_manager.done()
         return
-    except HTTPError:
+    except BackendHTTPError:
         await callback.message.answer(f"Упс, что-то пошло не так😳. Напиши, пожалуйста, {settings.ADMIN}.")
         await dialog_manager.done()
         return
 
-    del_from_redis(username)
+    await del_from_redis(username)
     await callback.message.answer(f"Ты был исключён из курса по фигме.", parse_mode=ParseMode.HTML)
     await dialog_manager.done()
 
@@ -1,8 +1,7 @@
 import logging
 import re
-from typing import Any
+from typing import Any, Awaitable, Callable, Optional
 
-import requests
 from aiogram import Bot, Router, types
 from aiogram.dispatcher.middlewares.user_context import EventContext
 from aiogram.enums import ParseMode
@@ -12,14 +11,13 @@ from aiogram.types import CallbackQuery, ContentType, Message
 from aiogram_dialog import Dialog, DialogManager, StartMode, Window
 from aiogram_dialog.widgets.input import MessageInput
 from aiogram_dialog.widgets.kbd import (Back, Button, Cancel, Column, Row,
-                                        ScrollingGroup, Select, Url)
+                                        Select, Url)
 from aiogram_dialog.widgets.text import Const, Format
-from requests import HTTPError
-from requests.exceptions import ConnectionError
 
 import settings
+from api import BackendConnectionError, BackendHTTPError, backend
 from shared import AccessMiddleware, Role, format_symbols
-from utils import del_from_redis, slugify, stringify
+from utils import del_from_redis, stringify
 
 router = Router()
 router.message.middleware(AccessMiddleware(role=Role.TUTOR))
@@ -32,17 +30,15 @@ class CheckHw(StatesGroup):
     hws_to_check = State()
 
 
-async def make_request(url, bot: Bot, dialog_manager: DialogManager, event_context: EventContext, data=None):
+async def make_request(request: Awaitable, bot: Bot, dialog_manager: DialogManager, event_context: EventContext):
     try:
-        response = requests.get(url, data=data)
-        response.raise_for_status()
-        return response
-    except ConnectionError as error:
+        return await request
+    except BackendConnectionError as error:
         logging.error(error)
         await bot.send_message(chat_id=event_context.chat_id, text="Сервер временно недоступен 😔\n"
                                                                    f"Напиши {settings.ADMIN}.")
         return None
-    except HTTPError as error:
+    except BackendHTTPError as error:
         logging.error(error)
         await bot.send_message(chat_id=event_context.chat_id, text=f"Упс, что-то пошло не так😳. "
                                                                    f"Напиши {settings.ADMIN}.")
@@ -50,18 +46,16 @@ async def make_request(url, bot: Bot, dialog_manager: DialogManager, event_conte
         return None
 
 
-async def make_request_(url, message: Message, dialog_manager: DialogManager = None, data=None):
+async def make_request_(request: Awaitable, message: Message, dialog_manager: DialogManager = None):
     try:
-        response = requests.get(url, data=data)
-        response.raise_for_status()
-        return response
-    except ConnectionError as error:
+        return await request
+    except BackendConnectionError as error:
         logging.error(error)
         await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
         if dialog_manager:
             await dialog_manager.done()
         return None
-    except HTTPError as error:
+    except BackendHTTPError as error:
         logging.error(error)
         await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
         if dialog_manager:
@@ -86,34 +80,66 @@ def format_hws_info_for_dialog(hws_info: list):
     }
 
 
-async def students_getter(bot: Bot, dialog_manager: DialogManager, event_context: EventContext, **kwargs):
-    '''возвращает список всех студентов, числящихся за ментором'''
+STUDENTS_PAGE = 8
 
-    tutor_username = event_context.user.username
-    response = await make_request(settings.BACKEND_URL + f"/{slugify(tutor_username)}/students", bot, dialog_manager,
-                                  event_context)
-    if not response:
-        return
 
-    students = response.json()
-    students_list = []
-    for student in students:
-        students_list.append(stringify(student['username']))
+def reset_students_pages(dialog_manager: DialogManager):
+    for key in ('students_pages', 'students_next', 'students_page'):
+        dialog_manager.dialog_data.pop(key, None)
+
 
+async def students_page(fetch: Callable[[Optional[str]], Awaitable], bot: Bot, dialog_manager: DialogManager,
+                        event_context: EventContext):
+    '''
+    Отдаёт видимую страницу студентов. С бэкенда за раз берутся две страницы - видимая и
+    следующая, поэтому листание вперёд обычно не ждёт запроса, а назад идёт по уже загруженным.
+    '''
+    data = dialog_manager.dialog_data
+    pages = data.setdefault('students_pages', [])
+    page = data.get('students_page', 0)
+    if not pages or (page + 1 >= len(pages) and data.get('students_next')):
+        students = await make_request(fetch(data.get('students_next')), bot, dialog_manager, event_context)
+        if students is None:
+            return
+        usernames = [stringify(student['username']) for student in students['results']]
+        for i in range(0, len(usernames), STUDENTS_PAGE):
+            pages.append(usernames[i:i + STUDENTS_PAGE])
+        if not pages:
+            pages.append([])
+        data['students_next'] = students['next']
+
+    page = min(page, len(pages) - 1)
+    data['students_page'] = page
     return {
-        'students_list': students_list
+        'students_list': pages[page],
+        'has_prev': page > 0,
+        'has_next': page + 1 < len(pages) or bool(data.get('students_next')),
     }
 
 
+async def on_students_page(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
+    step = 1 if button.widget_id.endswith('_next') else -1
+    dialog_manager.dialog_data['students_page'] = max(dialog_manager.dialog_data.get('students_page', 0) + step, 0)
+
+
+async def students_getter(bot: Bot, dialog_manager: DialogManager, event_context: EventContext, **kwargs):
+    '''возвращает страницу студентов, числящихся за ментором'''
+
+    tutor_username = event_context.user.username
+    return await students_page(
+        lambda cursor: backend.students(tutor_username, cursor=cursor, page_size=2 * STUDENTS_PAGE),
+        bot, dialog_manager, event_context
+    )
+
+
 async def homework_to_check_getter(bot: Bot, dialog_manager: DialogManager, event_context: EventContext, **kwargs):
     '''возвращает список студентов для проверки дз вместе с номерами дз, которые у них не проверены'''
 
     tutor_username = event_context.user.username
-    response = await make_request(settings.BACKEND_URL + f"/{slugify(tutor_username)}/groupedhwinfo", bot,
-                                  dialog_manager,
-                                  event_context)
+    tasks = await make_request(backend.grouped_hw_info(tutor_username), bot, dialog_manager, event_context)
+    if tasks is None:
+        return
 
-    tasks = response.json()
     homeworks_to_check = [[i + 1, format_symbols[i + 1], "0🏖"] for i in range(settings.TASKS)]
     for task in tasks:
         if task['kol']:
@@ -127,41 +153,40 @@ async def homework_to_check_getter(bot: Bot, dialog_manager: DialogManager, even
 async def on_homework_chosen(callback: CallbackQuery, widget: Any, dialog_manager: DialogManager, homework: str):
     dialog_manager.dialog_data['chosen_homework'] = homework
     dialog_manager.dialog_data['chosen_homework_format'] = format_symbols[int(homework)]
+    reset_students_pages(dialog_manager)
     await dialog_manager.switch_to(CheckHw.students_to_check)
 
 
 async def students_by_hw_getter(bot: Bot, dialog_manager: DialogManager, event_context: EventContext, **kwargs):
-    '''возвращает список всех студентов, числящихся за ментором'''
+    '''возвращает страницу студентов ментора с непроверенным выбранным дз'''
 
     tutor_username = event_context.user.username
     hw_id = int(dialog_manager.dialog_data['chosen_homework'])
-    response = await make_request(settings.BACKEND_URL + f"/{slugify(tutor_username)}/students/{hw_id}", bot,
-                                  dialog_manager,
-                                  event_context)
-
-    students = response.json()
-    students_list = []
-    for student in students:
-        students_list.append(stringify(student['username']))
-
-    return {
-        'students_list': students_list
-    }
+    return await students_page(
+        lambda cursor: backend.students_by_task(tutor_username, hw_id, cursor=cursor, page_size=2 * STUDENTS_PAGE),
+        bot, dialog_manager, event_context
+    )
 
 
 async def on_student_chosen(callback: CallbackQuery, widget: Any, dialog_manager: DialogManager, student_username: str):
     dialog_manager.dialog_data['chosen_student'] = student_username
+    dialog_manager.dialog_data.pop('student_card', None)
     await dialog_manager.switch_to(CheckHw.hws_to_check)
 
 
 async def chosen_student_hw_getter(bot: Bot, dialog_manager: DialogManager, event_context: EventContext, **kwargs):
-    student_username = dialog_manager.dialog_data['chosen_student']  # для запроса в бд
-    response = await make_request(settings.BACKEND_URL + f"/{slugify(student_username)}/homeworks", bot, dialog_manager,
-                                  event_context)
+    # карточка студента запрашивается один раз и дальше живёт в dialog_data, пока ментор в этом окне
+    card = dialog_manager.dialog_data.get('student_card')
+    if card is None:
+        student_username = dialog_manager.dialog_data['chosen_student']  # для запроса в бд
+        card = await make_request(backend.student_card(event_context.user.username, student_username), bot,
+                                  dialog_manager, event_context)
+        if card is None:
+            return
+        dialog_manager.dialog_data['student_card'] = card
 
-    homeworks = response.json()
     hws_info = [[i + 1, "", -1] for i in range(settings.TASKS)]
-    for homework in homeworks:
+    for homework in card['homeworks']:
         hws_info[homework['task'] - 1][1] = homework['url']
         mark = homework['mark']
         hws_info[homework['task'] - 1][2] = mark if mark is not None else -1
@@ -169,67 +194,80 @@ async def chosen_student_hw_getter(bot: Bot, dialog_manager: DialogManager, even
     return format_hws_info_for_dialog(hws_info)
 
 
+async def answer_wrong_mark_format(message: Message, reason: str = ""):
+    await message.answer(f"Формат оценки неверен😔{reason}\n\n"
+                         "Проверь формат и отправь оценку ещё раз.\n"
+                         "Пример сообщения:\n"
+                         "<i>3 3.25</i>\n", parse_mode=ParseMode.HTML)
+
+
 async def check_hw_handler(message: Message, message_input: MessageInput, dialog_manager: DialogManager):
-    text = message.text
     send_mark_pattern = r'^(\d+)\s+((10|[0-9](\.\d+)?))$'
     student_username = dialog_manager.dialog_data['chosen_student']
 
-    response = await make_request_(settings.BACKEND_URL + f"/{slugify(student_username)}/homeworks", message,
+    card = dialog_manager.dialog_data.get('student_card')
+    if card is None:
+        card = await make_request_(backend.student_card(message.from_user.username, student_username), message,
                                    dialog_manager)
-    if not response:
-        return
+        if card is None:
+            return
+        dialog_manager.dialog_data['student_card'] = card
 
-    homeworks = response.json()
     available_homeworks = []
-    for homework in homeworks:
+    for homework in card['homeworks']:
         available_homeworks.append(homework['task'])
 
-    match = re.match(send_mark_pattern, text)
-    if not match:
-        await message.answer("Формат оценки неверен😔.\n\n"
-                             "Проверь формат и отправь оценку ещё раз.\n"
-                             "Пример сообщения:\n"
-                             "<i>3 3.25</i>\n", parse_mode=ParseMode.HTML)
-        return
+    # каждая строка сообщения - отдельная оценка, несколько строк уходят на бэкенд одним запросом
+    marks = {}
+    for line in filter(None, map(str.strip, message.text.splitlines())):
+        match = re.match(send_mark_pattern, line)
+        if not match:
+            await answer_wrong_mark_format(message, ".")
+            return
 
-    hw_num = int(match.group(1))
-    if hw_num not in available_homeworks:
-        await message.answer(f"Формат оценки неверен😔, <b>@{student_username}</b> "
-                             f"ещё не сдавал дз {format_symbols[hw_num]}\n\n"
-                             "Проверь формат и отправь оценку ещё раз.\n"
-                             "Пример сообщения:\n"
-                             "<i>3 3.25</i>\n", parse_mode=ParseMode.HTML)
-        return
+        hw_num = int(match.group(1))
+        if hw_num not in available_homeworks:
+            await answer_wrong_mark_format(message, f", <b>@{student_username}</b> "
+                                                    f"ещё не сдавал дз {format_symbols.get(hw_num, hw_num)}")
+            return
+
+        hw_mark = float(match.group(2))
+        if hw_mark < 0 or hw_mark > 10:
+            await answer_wrong_mark_format(message, ", значение оценки должно быть от 0 до 10.")
+            return
 
-    hw_mark = float(match.group(2))
-    if hw_mark < 0 or hw_mark > 10:
-        await message.answer(f"Формат оценки неверен😔, значение оценки должно быть от 0 до 10.\n\n"
-                             "Проверь формат и отправь оценку ещё раз.\n"
-                             "Пример сообщения:\n"
-                             "<i>3 3.25</i>\n", parse_mode=ParseMode.HTML)
+        if hw_num in marks:
+            await answer_wrong_mark_format(message, f", дз {format_symbols[hw_num]} оценено несколько раз.")
+            return
+        marks[hw_num] = hw_mark
+
+    if not marks:
+        await answer_wrong_mark_format(message, ".")
         return
 
-    try:
-        response = requests.put(settings.BACKEND_URL + f"/{slugify(student_username)}/checkhw",
-                                data={
-                                    "task": hw_num,
-                                    "mark": hw_mark
-                                })
-        response.raise_for_status()
-    except ConnectionError as error:
-        logging.error(error)
-        await message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
-        await dialog_manager.done()
-        return None
-    except HTTPError as error:
-        logging.error(error)
-        await message.answer(f"Упс, что-то пошло не так😳. Напиши {settings.ADMIN}.")
-        await dialog_manager.done()
-        return None
+    if len(marks) == 1:
+        [(hw_num, hw_mark)] = marks.items()
+        hw_info = await make_request_(backend.check_homework(student_username, task=hw_num, mark=hw_mark), message,
+                                      dialog_manager)
+        if hw_info is None:
+            return
+        checked = [hw_info]
+    else:
+        result = await make_request_(backend.check_homeworks(message.from_user.username, [
+            {'student': student_username, 'task': hw_num, 'mark': hw_mark} for hw_num, hw_mark in marks.items()
+        ]), message, dialog_manager)
+        if result is None:
+            return
+        checked = result['checked']
+
+    # окно перерисуется из обновлённой карточки без повторного запроса
+    new_marks = {hw_info['task']: hw_info['mark'] for hw_info in checked}
+    for homework in card['homeworks']:
+        if homework['task'] in new_marks:
+            homework['mark'] = new_marks[homework['task']]
 
-    hw_info = response.json()
-    await message.answer(f"Дз {format_symbols[hw_info['task']]} от "
-                         f"<b>@{stringify(hw_info['username'])}</b> успешно оценено на <b>{hw_info['mark']}</b>🥳\n",
+    await message.answer('\n'.join(f"Дз {format_symbols[task]} от <b>@{student_username}</b> "
+                                   f"успешно оценено на <b>{mark}</b>🥳" for task, mark in new_marks.items()),
                          parse_mode=ParseMode.HTML)
 
 
@@ -237,6 +275,8 @@ async def back_from_student_info_button_handler(callback: CallbackQuery, button:
     if dialog_manager.dialog_data.get('chosen_homework') is None:
         await dialog_manager.switch_to(CheckHw.view_students)
     else:
+        # после проверки студент мог пропасть из списка, поэтому страницы загружаются заново
+        reset_students_pages(dialog_manager)
         await dialog_manager.switch_to(CheckHw.students_to_check)
 
 
@@ -246,7 +286,7 @@ check_hw_dialog = Dialog(
               "❗️ Выбрав студента, можно увидеть\n"
               " информацию о его домашках"),
 
-        ScrollingGroup(
+        Column(
             Select(
                 Format("{item}"),
                 id="all_students",
@@ -254,10 +294,10 @@ check_hw_dialog = Dialog(
                 items="students_list",
                 on_click=on_student_chosen,
             ),
-            id="students_group",
-            width=1,
-            height=8,
-            hide_on_single_page=True,
+        ),
+        Row(
+            Button(Const("⬅️"), id="students_prev", on_click=on_students_page, when="has_prev"),
+            Button(Const("➡️"), id="students_next", on_click=on_students_page, when="has_next"),
         ),
         Cancel(Const("Закончить")),
         state=CheckHw.view_students,
@@ -280,7 +320,7 @@ check_hw_dialog = Dialog(
     ),
     Window(
         Format("Студенты, у которых непроверена домашка {dialog_data[chosen_homework_format]}"),
-        ScrollingGroup(
+        Column(
             Select(
                 Format("{item}"),
                 id="students_by_hw",
@@ -288,10 +328,10 @@ check_hw_dialog = Dialog(
                 items="students_list",
                 on_click=on_student_chosen,
             ),
-            id="students_group_by_hw",
-            width=1,
-            height=8,
-            hide_on_single_page=True,
+        ),
+        Row(
+            Button(Const("⬅️"), id="students_by_hw_prev", on_click=on_students_page, when="has_prev"),
+            Button(Const("➡️"), id="students_by_hw_next", on_click=on_students_page, when="has_next"),
         ),
         Row(
             Back(Const("Назад")),
@@ -308,6 +348,7 @@ check_hw_dialog = Dialog(
               "❗️ <b>Оценка может быть дробной.</b>\n"
               "Пример сообщения:\n"
               "<i>3 3.25</i>\n\n"
+              "❗️ <b>Несколько оценок можно отправить одним сообщением, каждую с новой строки.</b>\n\n"
               "❗️ <b>Также можно переоценить уже проверенную домашку</b>\n"),
         Url(Format("{hws_info[0][text]}"), Format("{hws_info[0][url]}")),
         Url(Format("{hws_info[1][text]}"), Format("{hws_info[1][url]}")),
@@ -346,15 +387,14 @@ async def confirm_expel(callback: CallbackQuery, button: Button, dialog_manager:
     student_username = dialog_manager.dialog_data.get("student_to_expel")
     username = callback.from_user.username
     try:
-        response = requests.delete(settings.BACKEND_URL + f"/{slugify(username)}/expel/{stringify(student_username)}")
-        response.raise_for_status()
-    except ConnectionError as error:
+        await backend.expel(username, stringify(student_username))
+    except BackendConnectionError as error:
         logging.error(error)
         await callback.message.answer(f"Сервер временно недоступен 😔\nНапиши {settings.ADMIN}.")
         await dialog_manager.done()
         return
-    except HTTPError as error:
-        if error.response.status_code == 404:
+    except BackendHTTPError as error:
+        if error.status == 404:
             await callback.message.answer(f"Не вижу у тебя такого участника🤨\n\n"
                                           f"/students")
         else:
@@ -363,7 +403,7 @@ async def confirm_expel(callback: CallbackQuery, button: Button, dialog_manager:
         await dialog_manager.done()
         return
 
-    del_from_redis(student_username)
+    await del_from_redis(student_username)
     await callback.message.answer(f"Участник <b>@{student_username}</b> успешно исключён.",
                                   parse_mode=ParseMode.HTML)
     await dialog_manager.done()
@@ -411,12 +451,10 @@ async def get_statistics(message: types.Message, dialog_manager: DialogManager,
             return
 
     tutor_username = message.from_user.username
-    response = await make_request_(settings.BACKEND_URL + f"/{slugify(tutor_username)}/statistic/{limit}", message)
-
-    if not response:
+    statistics = await make_request_(backend.statistic(limit, tutor=tutor_username), message)
+    if statistics is None:
         return
 
-    statistics = response.json()
     students_statistics = []
     num = 1
     for statistic in statistics:
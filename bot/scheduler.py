@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+import settings
+from role_cache import redis
+
+
+class RedisChatLock:
+    '''
+    Лок чата, общий для всех процессов бота. Нужен при WEBHOOK_WORKERS > 1: SO_REUSEPORT
+    раскидывает апдейты одного чата по разным воркерам, а FSM у них общий в редисе.
+    Ttl страхует от упавшего воркера, поэтому он должен быть больше самого долгого хендлера.
+    '''
+    # снимаем только свой лок: чужой мог появиться, если наш истёк по ttl
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, redis: Redis, key: str) -> None:
+        self._redis = redis
+        self._key = key
+        self._token = uuid.uuid4().hex
+        self._locked = False
+
+    async def __aenter__(self):
+        delay = 0.005
+        try:
+            while not await self._redis.set(self._key, self._token, nx=True, px=settings.CHAT_LOCK_TTL * 1000):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.CHAT_LOCK_POLL)
+            self._locked = True
+        except RedisError as error:
+            # без редиса не работает и FSM, так что лучше обработать апдейт, чем потерять его
+            logging.error(f"chat lock {self._key}: {error}")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if not self._locked:
+            return
+        try:
+            await self._redis.eval(self.RELEASE, 1, self._key, self._token)
+        except RedisError as error:
+            logging.error(f"chat lock {self._key}: {error}")
+
+
+class UpdateScheduler(BaseMiddleware):
+    '''
+    Ограничивает число одновременно обрабатываемых апдейтов и обрабатывает апдейты
+    одного чата строго по очереди. Апдейты разных пользователей идут параллельно.
+    Внутри процесса порядок держит asyncio.Lock, а если передан redis - апдейты чата
+    ещё и не пересекаются с другими процессами (порядок между процессами - по приходу).
+    '''
+
+    def __init__(self, concurrency: int, redis: Optional[Redis] = None) -> None:
+        self._slots = asyncio.Semaphore(concurrency)
+        self._redis = redis
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+
+        self.queued = 0
+        self.running = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _get_lock(self, key):
+        if key is None:
+            return nullcontext()
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        return lock
+
+    def _release_lock(self, key):
+        if key is None:
+            return
+        self._lock_users[key] -= 1
+        if not self._lock_users[key]:
+            del self._lock_users[key]
+            del self._locks[key]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        key = chat.id if chat else user.id if user else None
+
+        enqueued_at = time.monotonic()
+        self.queued += 1
+        dequeued = False
+        # asyncio.Lock будит ожидающих в порядке FIFO, поэтому апдейты чата не перемешиваются
+        lock = self._get_lock(key)
+        try:
+            shared_lock = RedisChatLock(self._redis, f"chatlock:{key}") if self._redis and key else nullcontext()
+            async with lock, shared_lock, self._slots:
+                self.queued -= 1
+                dequeued = True
+                wait = time.monotonic() - enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+                self.running += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not dequeued:
+                self.queued -= 1
+            self._release_lock(key)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queued,
+            'running': self.running,
+            'processed': self.processed,
+            'chats': len(self._locks),
+            'avg_wait': self.total_wait / self.processed if self.processed else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+
+scheduler = UpdateScheduler(settings.UPDATE_CONCURRENCY, redis if settings.WEBHOOK_WORKERS > 1 else None)
@@ -15,3 +15,55 @@ ADMIN = os.environ.get("ADMIN", "админ")
 TASKS = int(os.environ.get("TASKS", 0))
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+BACKEND_TIMEOUT = float(os.environ.get("BACKEND_TIMEOUT", 10))
+BACKEND_POOL_SIZE = int(os.environ.get("BACKEND_POOL_SIZE", 100))
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", 50))
+# сколько секунд запрос ждёт свободное соединение, если весь пул занят
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 5))
+ROLE_CACHE_TTL = int(os.environ.get("ROLE_CACHE_TTL", 6 * 60 * 60))
+ROLE_NEGATIVE_TTL = int(os.environ.get("ROLE_NEGATIVE_TTL", 60))
+ROLE_LOCAL_CACHE_SIZE = int(os.environ.get("ROLE_LOCAL_CACHE_SIZE", 10000))
+ROLE_LOCAL_CACHE_TTL = int(os.environ.get("ROLE_LOCAL_CACHE_TTL", 60))
+ROLE_INVALIDATION_CHANNEL = os.environ.get("ROLE_INVALIDATION_CHANNEL", "roles:invalidate")
+TIMETABLE_TTL = int(os.environ.get("TIMETABLE_TTL", 60))
+# сколько ответов бэкенда с ETag держать в памяти для If-None-Match
+CONDITIONAL_CACHE_SIZE = int(os.environ.get("CONDITIONAL_CACHE_SIZE", 2048))
+
+# polling или webhook
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8080))
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 1))
+
+# сколько апдейтов обрабатывается одновременно
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", 100))
+# при WEBHOOK_WORKERS > 1 апдейты чата сериализуются локом в редисе:
+# ttl (с) должен быть больше самого долгого хендлера, poll (с) - максимальная пауза между попытками
+CHAT_LOCK_TTL = int(os.environ.get("CHAT_LOCK_TTL", 60))
+CHAT_LOCK_POLL = float(os.environ.get("CHAT_LOCK_POLL", 0.05))
+
+# лимиты телеграма на исходящие сообщения
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", 30))
+TG_CHAT_RATE = float(os.environ.get("TG_CHAT_RATE", 1))
+TG_GROUP_RATE = float(os.environ.get("TG_GROUP_RATE", 20 / 60))
+TG_CHAT_BURST = float(os.environ.get("TG_CHAT_BURST", 3))
+TG_CHAT_BUCKETS = int(os.environ.get("TG_CHAT_BUCKETS", 10000))
+TG_SEND_RETRIES = int(os.environ.get("TG_SEND_RETRIES", 3))
+# общий лимит TG_GLOBAL_RATE считается в редисе на все процессы и реплики бота
+TG_SHARED_RATE_LIMIT = os.environ.get("TG_SHARED_RATE_LIMIT", "true").lower() in ("1", "true")
+# сколько токенов общей корзины рассылки оставляют интерактивным ответам
+TG_BULK_RESERVE = float(os.environ.get("TG_BULK_RESERVE", 5))
+
+# рассылки и напоминания о дедлайнах
+BROADCAST_BATCH = int(os.environ.get("BROADCAST_BATCH", 100))
+BROADCAST_LOCK_TTL = int(os.environ.get("BROADCAST_LOCK_TTL", 120))
+BROADCAST_KEEP = int(os.environ.get("BROADCAST_KEEP", 7 * 24 * 60 * 60))
+# повторы отправки одного сообщения рассылки при сетевых ошибках и 5xx телеграма
+BROADCAST_SEND_RETRIES = int(os.environ.get("BROADCAST_SEND_RETRIES", 2))
+# через сколько секунд перезапускается прерванная рассылка
+BROADCAST_RETRY_DELAY = int(os.environ.get("BROADCAST_RETRY_DELAY", 30))
+REMINDER_HOUR = int(os.environ.get("REMINDER_HOUR", 12))
+REMINDER_CHECK_INTERVAL = int(os.environ.get("REMINDER_CHECK_INTERVAL", 10 * 60))
@@ -3,16 +3,12 @@ from enum import Enum
 from typing import Any, Awaitable, Callable, Dict
 
 import pytz
-import requests
 from aiogram import BaseMiddleware, types
 from aiogram.types import Message
-from redis import Redis
-from redis.exceptions import ConnectionError as RedisConnectionError
-from requests import HTTPError
-from requests.exceptions import ConnectionError
 
+import role_cache
 import settings
-from utils import slugify
+from api import BackendConnectionError, BackendHTTPError, backend
 
 format_symbols = {
     1: "1️⃣",
@@ -31,58 +27,60 @@ class Role(Enum):
     STUDENT = 3
 
 
+async def answer_not_member(message: types.Message):
+    await message.answer("Не вижу тебя среди участников 😭.\n\n"
+                         f"Если ты заполнял гугл форму, то напиши, пожалуйста, {settings.ADMIN}."
+                         " Если нет, то, к сожалению, регистрация уже закончилась😢\n\n"
+                         f"Если у тебя уже был доступ у боту, значит ты был исключён из курса☹️\n\n"
+                         "Ждём тебя в следующем сезоне!")
+
+
 async def get_role(message: types.Message, cache=False):
     username = message.from_user.username
 
     if not cache:
-        try:
-            redis = Redis.from_url(url=settings.REDIS_URL)
-        except RedisConnectionError as error:
-            logging.error(error)
-        role = redis.get(username)
-        redis.close()
-        if role:
-            return int(role.decode())
+        role = await role_cache.get_cached_role(username)
+        if role == role_cache.NOT_MEMBER:
+            await answer_not_member(message)
+            return None
+        if role is not None:
+            return role
 
     try:
-        response = requests.get(settings.BACKEND_URL + f'/{slugify(username)}/whoami')
-    except ConnectionError as error:
+        member = await backend.whoami(username)
+    except BackendConnectionError as error:
         logging.error(error)
         await message.answer("Сервер временно недоступен 😔\nНад этим уже работают!\n\nПопробуй ещё раз позже.")
         return None
+    except BackendHTTPError as error:
+        if error.status == 404:
+            await role_cache.cache_not_member(username)
+            await answer_not_member(message)
+        else:
+            await message.answer(f"Упс, что-то пошло не так😳. Напиши, пожалуйста {settings.ADMIN}.")
+        return None
 
-    if response.status_code == 200:
+    await role_cache.cache_role(username, member['role'])
+    if message.chat.type == 'private':
+        # chat_id нужен бэкенду для рассылок и напоминаний о дедлайнах
         try:
-            redis = Redis.from_url(url=settings.REDIS_URL)
-            redis.set(username, response.json()['role'])
-            redis.close()
-        except ConnectionError as error:
+            await backend.register_chat(username, message.chat.id)
+        except (BackendConnectionError, BackendHTTPError) as error:
             logging.error(error)
-        return response.json()['role']
-    elif response.status_code == 404:
-        await message.answer("Не вижу тебя среди участников 😭.\n\n"
-                             f"Если ты заполнял гугл форму, то напиши, пожалуйста, {settings.ADMIN}."
-                             " Если нет, то, к сожалению, регистрация уже закончилась😢\n\n"
-                             f"Если у тебя уже был доступ у боту, значит ты был исключён из курса☹️\n\n"
-                             "Ждём тебя в следующем сезоне!")
-    else:
-        await message.answer(f"Упс, что-то пошло не так😳. Напиши, пожалуйста {settings.ADMIN}.")
-    return None
+    return member['role']
 
 
 async def get_timetable(message: types.Message):
     try:
-        response = requests.get(settings.BACKEND_URL + "/timetable")
-        response.raise_for_status()
-    except ConnectionError as error:
+        return await backend.timetable()
+    except BackendConnectionError as error:
         logging.error(error)
         await message.answer("Сервер временно недоступен 😔\nНад этим уже работают!\n\nПопробуй ещё раз позже.")
         return None
-    except HTTPError as error:
+    except BackendHTTPError as error:
         logging.error(error)
         await message.answer(f"Упс, что-то пошло не так😳. Напиши, пожалуйста {settings.ADMIN}.")
         return None
-    return response.json()
 
 
 class AccessMiddleware(BaseMiddleware):
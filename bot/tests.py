@@ -0,0 +1,149 @@
+'''
+Тесты движка рассылок и очереди исходящих запросов. Редис - fakeredis, телеграм - поддельный бот.
+
+    python -m unittest tests
+'''
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage
+from fakeredis.aioredis import FakeRedis
+
+import broadcast
+import settings
+from outbound import OutboundQueue
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        # chat_id -> список исключений, которые поднимут следующие отправки в этот чат
+        self.errors = errors or {}
+        self.delivered = []
+
+    async def send_message(self, chat_id, text):
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        self.delivered.append(chat_id)
+
+
+class BroadcastTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis()
+        for target, attribute, value in ((broadcast, 'redis', self.redis),
+                                         (settings, 'BROADCAST_BATCH', 5),
+                                         (settings, 'BROADCAST_SEND_RETRIES', 0),
+                                         (settings, 'BROADCAST_RETRY_DELAY', 0)):
+            patcher = patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def start(self, bot, recipients):
+        with patch.object(broadcast.backend, 'recipients', AsyncMock(return_value=recipients)):
+            job_id, _ = await broadcast.start_broadcast(bot, 'текст')
+        await self.wait_background()
+        return job_id
+
+    async def wait_background(self):
+        # перезапуск прерванной рассылки тоже фоновая задача
+        while broadcast._tasks:
+            await asyncio.gather(*list(broadcast._tasks))
+
+    async def job(self, job_id):
+        job = await self.redis.hgetall(broadcast._job_key(job_id))
+        return {key.decode(): value.decode() for key, value in job.items()}
+
+    async def test_telegram_errors_count_as_failed(self):
+        bot = FakeBot({2: [TelegramForbiddenError(method=None, message='blocked')],
+                       4: [TelegramNetworkError(method=None, message='timeout')]})
+        job_id = await self.start(bot, [1, 2, 3, 4, 5, 6, 7])
+
+        self.assertEqual(bot.delivered, [1, 3, 5, 6, 7])
+        job = await self.job(job_id)
+        self.assertEqual((job['sent'], job['failed'], job['cursor']), ('5', '2', '7'))
+        self.assertFalse(await self.redis.sismember(broadcast.ACTIVE_KEY, job_id))
+
+    async def test_network_error_is_retried(self):
+        bot = FakeBot({2: [TelegramNetworkError(method=None, message='timeout')]})
+        with patch.object(settings, 'BROADCAST_SEND_RETRIES', 1), \
+                patch.object(broadcast.asyncio, 'sleep', AsyncMock()):
+            job_id = await self.start(bot, [1, 2, 3])
+
+        self.assertEqual(sorted(bot.delivered), [1, 2, 3])
+        self.assertEqual((await self.job(job_id))['failed'], '0')
+
+    async def test_interrupted_broadcast_is_rescheduled_without_resending(self):
+        # неожиданная ошибка посреди батча прерывает рассылку, остальные отправки батча доходят
+        bot = FakeBot({3: [RuntimeError('boom')]})
+        job_id = await self.start(bot, [1, 2, 3, 4, 5, 6, 7])
+
+        self.assertEqual(sorted(bot.delivered), [1, 2, 3, 4, 5, 6, 7])
+        job = await self.job(job_id)
+        self.assertEqual((job['sent'], job['failed'], job['cursor']), ('7', '0', '7'))
+        self.assertFalse(await self.redis.sismember(broadcast.ACTIVE_KEY, job_id))
+        self.assertFalse(await self.redis.exists(broadcast._lock_key(job_id), broadcast._done_key(job_id)))
+
+    async def test_resume_skips_delivered(self):
+        # рассылка упала вместе с процессом: двое из первого батча уже получили сообщение
+        job_id = 'resumed'
+        await self.redis.rpush(broadcast._recipients_key(job_id), 1, 2, 3, 4, 5, 6)
+        await self.redis.hset(broadcast._job_key(job_id), mapping={
+            'text': 'текст', 'total': 6, 'sent': 2, 'failed': 0, 'cursor': 0, 'notify_chat': 0, 'created': '',
+        })
+        await self.redis.sadd(broadcast._done_key(job_id), 0, 2)
+        await self.redis.sadd(broadcast.ACTIVE_KEY, job_id)
+
+        bot = FakeBot()
+        await broadcast.resume_broadcasts(bot)
+        await self.wait_background()
+
+        self.assertEqual(sorted(bot.delivered), [2, 4, 5, 6])
+        job = await self.job(job_id)
+        self.assertEqual((job['sent'], job['cursor']), ('6', '6'))
+
+    async def test_busy_lock_is_left_alone(self):
+        job_id = await self.start(FakeBot(), [])
+        await self.redis.sadd(broadcast.ACTIVE_KEY, job_id)
+        await self.redis.set(broadcast._lock_key(job_id), 'another-replica')
+
+        await broadcast.run_broadcast(FakeBot(), job_id)
+        self.assertTrue(await self.redis.sismember(broadcast.ACTIVE_KEY, job_id))
+
+
+class OutboundQueueTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.queue = OutboundQueue()
+        self.make_request = AsyncMock(return_value='ok')
+
+    async def test_last_attempt_is_unconditional(self):
+        for retries in (0, 1):
+            with patch.object(settings, 'TG_SEND_RETRIES', retries):
+                self.assertEqual(await self.queue(self.make_request, None, SendMessage(chat_id=1, text='x')), 'ok')
+        self.assertEqual(self.make_request.await_count, 2)
+
+    async def test_shared_bucket_failure_falls_back_to_local(self):
+        self.queue._shared = AsyncMock()
+        self.queue._shared.try_consume.side_effect = OSError('connection reset')
+        results = await asyncio.wait_for(asyncio.gather(
+            *(self.queue(self.make_request, None, SendMessage(chat_id=chat_id, text='x')) for chat_id in (1, 2, 3))), 1)
+        self.assertEqual(results, ['ok'] * 3)
+
+    async def test_edits_skip_chat_limit(self):
+        with patch.object(settings, 'TG_CHAT_RATE', 0.01), patch.object(settings, 'TG_CHAT_BURST', 1):
+            await self.queue(self.make_request, None, SendMessage(chat_id=1, text='x'))
+            # листание диалога правит одно сообщение много раз подряд
+            for _ in range(3):
+                await asyncio.wait_for(
+                    self.queue(self.make_request, None, EditMessageText(chat_id=1, message_id=1, text='y')), 1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.queue(self.make_request, None, SendMessage(chat_id=1, text='z')), 0.2)
+
+    async def test_retry_after_is_retried(self):
+        self.make_request.side_effect = [TelegramRetryAfter(method=None, message='flood', retry_after=0), 'ok']
+        with patch.object(settings, 'TG_SEND_RETRIES', 2):
+            self.assertEqual(await self.queue(self.make_request, None, SendMessage(chat_id=1, text='x')), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
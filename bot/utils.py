@@ -1,12 +1,9 @@
-import logging
 import os
 from datetime import datetime
 
 import pytz
-from redis import Redis
-from redis.exceptions import ConnectionError as RedisConnectionError
 
-import settings
+import role_cache
 
 tz = pytz.timezone('Europe/Moscow')
 
@@ -36,9 +33,5 @@ def compare_date_str_to_now(date_str):
         return 1
 
 
-def del_from_redis(key):
-    try:
-        redis = Redis.from_url(url=settings.REDIS_URL)
-        redis.delete(key)
-    except RedisConnectionError as error:
-        logging.error(error)
+async def del_from_redis(key):
+    await role_cache.forget_role(key)